@@ -0,0 +1,612 @@
+'''
+Counterfactual regret minimization (CFR+) for the game of leduc.Poker, as
+simulate() plays it: 3 community cards dealt with the hands, a betting
+round, a 4th card, a betting round, then the 5th card and the showdown.
+
+The game is abstracted in two ways:
+  - cards: each player only knows the hand strength bucket of its cards at
+    each betting round, a quantile of the rank of hand + board (BucketModel).
+    A player's private state is its bucket in round 1, then the pair of its
+    buckets in round 2: K and K * K states for K buckets.
+  - betting: players know what Poker.state shows, the round, the chips put
+    in by each player and the actions of this round (publicKey()), so
+    histories that reach the same bets share their strategy.
+
+The betting tree is generated with leduc.PokerState, so it follows
+Poker.successor() and legalActions(). Chance is folded into the joint
+probabilities of both players' buckets, sampled once up front. A pass over
+the tree then carries the reach probabilities of all private states of
+both players as two vectors, and every node updates the regrets of all the
+states in its information set in one NumPy operation.
+
+    model = BucketModel.sample(numBuckets=10)
+    solver = CFRSolver(model)
+    solver.solve(2000)
+    player = CFRPlayer(solver)
+
+MonteCarloCFR solves the game without the card abstraction, sampling deals
+and keeping its information sets in a hashed table (InfoSetTable), on
+several processes:
+
+    solver = MonteCarloCFR()
+    solveMonteCarloCFR(solver, 10 ** 6, workers=4)
+    player = MonteCarloCFRPlayer(solver)
+'''
+import multiprocessing
+import random
+import timeit
+
+import numpy as np
+
+from deuces import Deck
+from deuces.batch import BatchEvaluator
+from deuces.flatlookup import FlatLookupTable
+from deuces.isomorphism import HandIndexer
+from leduc import DEALER, PLAYER1, PLAYER2, Player, PokerState, evaluator, handStrength
+
+# the game as simulate() plays it
+NUM_ROUNDS = 5
+FIRST_BOARD = 3
+
+# Public part of an information set: number of community cards, chips put in
+# by each player, ids of player1's actions this round (-1 if none yet) and
+# the player to act.
+def publicKey(state):
+    return (len(state.communityCards), state.player1Bet, state.player2Bet,
+            state.roundFirstAction, state.roundSecondAction, state.currentPlayer)
+
+# publicKey() of a live leduc.Poker game.
+def gamePublicKey(game):
+    return publicKey(PokerState.fromGame(game))
+
+#################
+# Bucket Model  #
+#################
+class BucketModel:
+    '''
+    Hand strength buckets and the probabilities chance deals them with.
+      numBuckets (K): buckets per round
+      boundaries: for round 1 and 2, the K - 1 ranks splitting the ranks of
+        hand + board into K equally likely buckets
+      joint[r]: (K^r, K^r) array, joint[r][s1, s2] is the probability that
+        player1 is in private state s1 and player2 in s2 in round r
+      wins: (K^2, K^2) array, the probability of each pair of round 2
+        states together with player1 winning the showdown
+    The showdown is won as in Poker.utility(): player1 wins if its rank is
+    higher than player2's, and loses ties.
+    '''
+    def __init__(self, numBuckets, boundaries, joint, wins):
+        self.numBuckets = numBuckets
+        self.boundaries = boundaries
+        self.joint = joint
+        self.wins = wins
+
+    def numStates(self, r):
+        return self.numBuckets ** r
+
+    # Bucket of each rank in round |r|, ranks may be an array.
+    def bucket(self, r, ranks):
+        return np.searchsorted(self.boundaries[r], ranks, side='right')
+
+    # Private state index of a hand in round |r| from its ranks on the boards
+    # of rounds 1..r.
+    def stateIndex(self, r, ranks):
+        index = 0
+        for i in range(r):
+            index = index * self.numBuckets + int(self.bucket(i + 1, ranks[i]))
+        return index
+
+    # Estimates the model from |deals| random deals.
+    @staticmethod
+    def sample(numBuckets=10, deals=1 << 19, seed=0, chunkSize=1 << 16):
+        batch = BatchEvaluator(FlatLookupTable.shared())
+        rng = np.random.RandomState(seed)
+
+        ranks = dict((key, []) for key in [(p, r) for p in (1, 2) for r in (1, 2, 3)])
+        for start in range(0, deals, chunkSize):
+            n = min(chunkSize, deals - start)
+            cards = rng.rand(n, 52).argsort(axis=1)[:, :9]
+            for p, hand in ((1, cards[:, :2]), (2, cards[:, 2:4])):
+                for r, boardSize in ((1, 3), (2, 4), (3, 5)):
+                    ranks[p, r].append(batch.evaluate(hand, cards[:, 4:4 + boardSize]))
+        ranks = dict((key, np.concatenate(values).astype(np.int64)) for key, values in ranks.items())
+
+        quantiles = np.linspace(0, 100, numBuckets + 1)[1:-1]
+        boundaries = {}
+        for r in (1, 2):
+            boundaries[r] = np.percentile(np.concatenate((ranks[1, r], ranks[2, r])), quantiles)
+        model = BucketModel(numBuckets, boundaries, {}, None)
+
+        K = numBuckets
+        b = dict((key, model.bucket(key[1], ranks[key])) for key in ranks if key[1] < 3)
+        state1 = {1: b[1, 1], 2: b[1, 1] * K + b[1, 2]}
+        state2 = {1: b[2, 1], 2: b[2, 1] * K + b[2, 2]}
+        for r in (1, 2):
+            size = model.numStates(r)
+            model.joint[r] = np.bincount(state1[r] * size + state2[r], minlength=size * size).reshape(size, size) / float(deals)
+
+        won = ranks[1, 3] > ranks[2, 3]
+        size = model.numStates(2)
+        model.wins = np.bincount(state1[2] * size + state2[2], weights=won,
+                                 minlength=size * size).reshape(size, size) / float(deals)
+        return model
+
+#################
+# Betting Tree  #
+#################
+class Node:
+    '''
+    A node of the betting tree.
+      kind: 'decision', 'chance' (the 4th card) or 'terminal'
+      round: betting round, 1 or 2
+      player: PLAYER1 or PLAYER2 at decision nodes
+      key: publicKey() at decision nodes
+      actions, children: the legal actions and the nodes they lead to
+      player1Bet, player2Bet, fold: at terminal nodes, fold is PLAYER1,
+        PLAYER2 or None for a showdown
+    '''
+    def __init__(self, kind, round):
+        self.kind = kind
+        self.round = round
+        self.children = []
+        self.actions = []
+
+# Builds the betting tree from the start of the game. Cards are irrelevant to
+# the betting, so the board is made of placeholder cards.
+def buildTree(player1Stack=100, player2Stack=100):
+    state = PokerState((), (), [0] * FIRST_BOARD, num_rounds=NUM_ROUNDS,
+                       player1Stack=player1Stack, player2Stack=player2Stack)
+    return expand(state)
+
+def expand(state):
+    round = len(state.communityCards) - FIRST_BOARD + 1
+    if state.isEnd():
+        node = Node('terminal', min(round, 2))
+        node.player1Bet = state.player1Bet
+        node.player2Bet = state.player2Bet
+        node.fold = PLAYER1 if state.player1Fold else PLAYER2 if state.player2Fold else None
+        return node
+
+    if state.currentPlayer == DEALER:
+        state.apply('draw_card', (0,))
+        child = expand(state)
+        state.undo()
+        if child.kind == 'terminal':
+            return child
+        node = Node('chance', round)
+        node.children = [child]
+        return node
+
+    node = Node('decision', round)
+    node.player = state.currentPlayer
+    node.key = publicKey(state)
+    node.actions = state.legalActions()
+    for action in node.actions:
+        state.apply(action)
+        node.children.append(expand(state))
+        state.undo()
+    return node
+
+def decisionNodes(node):
+    if node.kind == 'decision':
+        yield node
+    for child in node.children:
+        for n in decisionNodes(child):
+            yield n
+
+#################
+# CFR Solver    #
+#################
+class CFRSolver:
+    '''
+    CFR+ over the abstraction of a BucketModel: regret matching+ with
+    alternating updates and linearly weighted strategy averaging.
+      regrets[key], strategySums[key]: (states, actions) arrays per
+        information set, states being the private states of the acting
+        player in that round
+    '''
+    def __init__(self, model, tree=None):
+        self.model = model
+        self.tree = tree or buildTree()
+        self.regrets = {}
+        self.strategySums = {}
+        self.actions = {}
+        for node in decisionNodes(self.tree):
+            if node.key in self.regrets:
+                continue
+            shape = (model.numStates(node.round), len(node.actions))
+            self.regrets[node.key] = np.zeros(shape)
+            self.strategySums[node.key] = np.zeros(shape)
+            self.actions[node.key] = node.actions
+        self.iterations = 0
+
+    # Regret matching: play actions in proportion to their positive regret,
+    # uniformly when none is positive.
+    @staticmethod
+    def regretMatching(regrets):
+        positive = np.maximum(regrets, 0.0)
+        total = positive.sum(axis=1)[:, np.newaxis]
+        uniform = np.ones_like(regrets) / regrets.shape[1]
+        return np.where(total > 0, positive / np.maximum(total, 1e-300), uniform)
+
+    def currentStrategy(self):
+        return dict((key, self.regretMatching(r)) for key, r in self.regrets.items())
+
+    # The average strategy, the one that converges to an equilibrium.
+    def averageStrategy(self):
+        strategy = {}
+        for key, sums in self.strategySums.items():
+            total = sums.sum(axis=1)[:, np.newaxis]
+            uniform = np.ones_like(sums) / sums.shape[1]
+            strategy[key] = np.where(total > 0, sums / np.maximum(total, 1e-300), uniform)
+        return strategy
+
+    def solve(self, iterations, printEvery=0):
+        for i in range(iterations):
+            self.iterations += 1
+            for traverser in (PLAYER1, PLAYER2):
+                strategy = self.currentStrategy()
+                deltas = dict((key, np.zeros_like(r)) for key, r in self.regrets.items())
+                ones = np.ones(self.model.numStates(1))
+                self.walk(self.tree, ones, ones, strategy, traverser, deltas)
+                for key, delta in deltas.items():
+                    if delta.any():
+                        np.maximum(self.regrets[key] + delta, 0.0, out=self.regrets[key])
+            if printEvery and self.iterations % printEvery == 0:
+                print('******* CFR iteration {} *******'.format(self.iterations))
+                print('game value: {:.4f}'.format(self.gameValue()))
+        return self
+
+    # player1's expected utility when both play |strategy| (the average
+    # strategy by default).
+    def gameValue(self, strategy=None):
+        strategy = strategy or self.averageStrategy()
+        ones = np.ones(self.model.numStates(1))
+        values1, values2 = self.walk(self.tree, ones, ones, strategy)
+        return values1.sum()
+
+    # Returns the counterfactual values of every private state of player1 and
+    # player2 at |node|, given their reach probabilities |reach1|, |reach2|.
+    # When |traverser| is given, adds its regrets to |deltas| and its
+    # strategy to the averages.
+    def walk(self, node, reach1, reach2, strategy, traverser=None, deltas=None):
+        if node.kind == 'terminal':
+            joint = self.model.joint[node.round]
+            if node.fold == PLAYER1:
+                payoff = -node.player1Bet * joint
+            elif node.fold == PLAYER2:
+                payoff = node.player2Bet * joint
+            else:
+                wins = self.model.wins
+                payoff = node.player2Bet * wins - node.player1Bet * (joint - wins)
+            return payoff.dot(reach2), -payoff.T.dot(reach1)
+
+        if node.kind == 'chance':
+            K = self.model.numBuckets
+            values1, values2 = self.walk(node.children[0], np.repeat(reach1, K), np.repeat(reach2, K),
+                                         strategy, traverser, deltas)
+            return values1.reshape(-1, K).sum(axis=1), values2.reshape(-1, K).sum(axis=1)
+
+        sigma = strategy[node.key]
+        childValues = []
+        for a, child in enumerate(node.children):
+            if node.player == PLAYER1:
+                childValues.append(self.walk(child, reach1 * sigma[:, a], reach2, strategy, traverser, deltas))
+            else:
+                childValues.append(self.walk(child, reach1, reach2 * sigma[:, a], strategy, traverser, deltas))
+
+        mine = 0 if node.player == PLAYER1 else 1
+        actionValues = np.array([v[mine] for v in childValues]).T
+        values = [None, None]
+        values[mine] = (sigma * actionValues).sum(axis=1)
+        values[1 - mine] = sum(v[1 - mine] for v in childValues)
+
+        if traverser == node.player:
+            reach = reach1 if node.player == PLAYER1 else reach2
+            deltas[node.key] += actionValues - values[mine][:, np.newaxis]
+            self.strategySums[node.key] += self.iterations * reach[:, np.newaxis] * sigma
+        return values[0], values[1]
+
+#################
+# CFR Player    #
+#################
+class CFRPlayer(Player):
+    '''
+    Plays the average strategy of a CFRSolver, in either seat: buckets its
+    own hand, looks up the information set of the game and samples an
+    action with the random module.
+    '''
+    def __init__(self, solver, strategy=None):
+        self.model = solver.model
+        self.strategy = strategy or solver.averageStrategy()
+        self.actions = solver.actions
+
+    # The legal actions in |game| and their probabilities, uniform in
+    # information sets the solver does not know.
+    def policy(self, game):
+        player = game.player()
+        if player == 'Dealer':
+            return ['draw_card'], [1.0]
+
+        state = game.state
+        hand = state['player1Hand'] if player == 'Player1' else state['player2Hand']
+        board = state['communityCards']
+        round = len(board) - FIRST_BOARD + 1
+        key = gamePublicKey(game)
+        if key not in self.strategy:
+            actions = game.legalActions(state)
+            return actions, [1.0 / len(actions)] * len(actions)
+
+        ranks = [handStrength.rank(hand, board[:FIRST_BOARD + i]) for i in range(round)]
+        return self.actions[key], self.strategy[key][self.model.stateIndex(round, ranks)].tolist()
+
+    def actionProbabilities(self, game):
+        return dict(zip(*self.policy(game)))
+
+    def getAction(self, game):
+        return sampleAction(*self.policy(game))
+
+# One of |actions| drawn with |probabilities| (which may be unnormalized)
+# with the random module.
+def sampleAction(actions, probabilities):
+    x = random.random() * sum(probabilities)
+    for action, p in zip(actions, probabilities):
+        x -= p
+        if x < 0:
+            return action
+    return actions[-1]
+
+#####################
+# Monte Carlo CFR   #
+#####################
+# Without abstraction of the cards, a player's information set is its own
+# hand, the board it has seen and the public key. There are far too many of
+# them to walk the chance tree, so MonteCarloCFR samples one deal per
+# iteration and walks the betting tree for that deal only (external
+# sampling): every action of the traverser, one sampled action of its
+# opponent.
+# Deals that are the same up to a permutation of the suits play the same,
+# so the private part of an information set is the HandIndexer id of the
+# hand and board, the flop and the 4th card kept apart.
+
+HAND_INDEXER = HandIndexer.shared((2, FIRST_BOARD, 1))
+
+MAX_ACTIONS = 3
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+class InfoSetTable:
+    '''
+    Regrets and strategy sums of information sets, hashed into 2^|bits| slots
+    of fixed size NumPy arrays instead of a dict, so a table has a known
+    memory footprint (40 bytes a slot) and can be shipped and merged as
+    arrays. Information sets that collide share their slot.
+      regrets, strategySums: (slots, MAX_ACTIONS) arrays, an information set
+        uses the first len(actions) columns
+    '''
+    def __init__(self, bits=20):
+        self.bits = bits
+        self.regrets = np.zeros((1 << bits, MAX_ACTIONS))
+        self.strategySums = np.zeros((1 << bits, MAX_ACTIONS), dtype=np.float32)
+
+    # Slot of an information set given as a non-negative int.
+    def slot(self, key):
+        return ((key * HASH_MULTIPLIER) & HASH_MASK) >> (64 - self.bits)
+
+    def occupied(self):
+        return int(np.count_nonzero(self.strategySums.any(axis=1)))
+
+    # Average strategy of the slots (all of them by default), uniform over
+    # the columns of empty slots.
+    def averageStrategy(self, slots=None):
+        sums = self.strategySums if slots is None else self.strategySums[slots]
+        total = sums.sum(axis=1)[:, np.newaxis]
+        return np.where(total > 0, sums / np.maximum(total, 1e-30), 1.0 / MAX_ACTIONS)
+
+    # Adds the changes made by workers, (slots, regrets, strategySums) arrays
+    # as returned by MonteCarloCFR.changes().
+    def merge(self, changes):
+        for slots, regrets, strategySums in changes:
+            np.add.at(self.regrets, slots, regrets)
+            np.add.at(self.strategySums, slots, strategySums)
+
+class MonteCarloCFR:
+    '''
+    External sampling Monte Carlo CFR on the full game, deals drawn from a
+    deuces Deck.
+      table: the InfoSetTable updated in place
+      rng: random.Random instance for the deals and the sampled actions
+    Writes to the table are tracked so that a worker can send back only the
+    slots it changed, see changes().
+    '''
+    def __init__(self, table=None, tree=None, seed=None):
+        self.table = table or InfoSetTable()
+        self.tree = tree or buildTree()
+        self.rng = random.Random(seed)
+        self.deck = Deck(self.rng)
+        self.iterations = 0
+        self.original = {}
+
+        # decision nodes are numbered by public key, as information sets
+        self.keyIds = {}
+        self.actions = {}
+        for node in decisionNodes(self.tree):
+            if node.key not in self.keyIds:
+                self.keyIds[node.key] = len(self.keyIds)
+                self.actions[node.key] = node.actions
+        for node in decisionNodes(self.tree):
+            node.keyId = self.keyIds[node.key]
+
+    # Private part of the information sets of a player holding |hand| on
+    # |board|, for each round: the HAND_INDEXER id of the cards seen so far.
+    @staticmethod
+    def privateKeys(hand, board):
+        cards = list(hand) + list(board)
+        return [None] + HAND_INDEXER.index_rounds(cards, HAND_INDEXER.round_of(len(cards)) + 1)[1:]
+
+    def infoSetKey(self, keyId, privateKey):
+        return (privateKey << 5) | keyId
+
+    def iterate(self, iterations):
+        rng, deck = self.rng, self.deck
+        for i in xrange(iterations):
+            deck.shuffle()
+            hand1, hand2, board = deck.draw(2), deck.draw(2), deck.draw(5)
+            won = evaluator.evaluate(board, hand1) > evaluator.evaluate(board, hand2)
+            keys = {PLAYER1: self.privateKeys(hand1, board[:4]), PLAYER2: self.privateKeys(hand2, board[:4])}
+            for traverser in (PLAYER1, PLAYER2):
+                self.traverse(self.tree, traverser, keys, won)
+            self.iterations += 1
+
+    # Value of |node| for |traverser| on the sampled deal, updating the
+    # regrets of the traverser and the strategy sums of the opponent.
+    def traverse(self, node, traverser, keys, won):
+        if node.kind == 'terminal':
+            if node.fold == PLAYER1:
+                value = -node.player1Bet
+            elif node.fold == PLAYER2:
+                value = node.player2Bet
+            else:
+                value = node.player2Bet if won else -node.player1Bet
+            return value if traverser == PLAYER1 else -value
+        if node.kind == 'chance':
+            return self.traverse(node.children[0], traverser, keys, won)
+
+        table = self.table
+        n = len(node.actions)
+        slot = table.slot(self.infoSetKey(node.keyId, keys[node.player][node.round]))
+        if slot not in self.original:
+            self.original[slot] = (table.regrets[slot].copy(), table.strategySums[slot].copy())
+        regrets = table.regrets[slot, :n].tolist()
+        positive = [r if r > 0 else 0.0 for r in regrets]
+        total = sum(positive)
+        sigma = [p / total for p in positive] if total > 0 else [1.0 / n] * n
+
+        if node.player == traverser:
+            values = [self.traverse(child, traverser, keys, won) for child in node.children]
+            value = sum(s * v for s, v in zip(sigma, values))
+            table.regrets[slot, :n] += np.array(values) - value
+            return value
+
+        table.strategySums[slot, :n] += sigma
+        x = self.rng.random()
+        for a in range(n - 1):
+            x -= sigma[a]
+            if x < 0:
+                break
+        else:
+            a = n - 1
+        return self.traverse(node.children[a], traverser, keys, won)
+
+    # The (slots, regret deltas, strategy sum deltas) of the slots changed
+    # since the last call.
+    def changes(self):
+        slots = np.array(sorted(self.original), dtype=np.int64)
+        regrets = np.array([self.original[s][0] for s in slots]).reshape(-1, MAX_ACTIONS)
+        strategySums = np.array([self.original[s][1] for s in slots]).reshape(-1, MAX_ACTIONS)
+        self.original = {}
+        return slots, self.table.regrets[slots] - regrets, self.table.strategySums[slots] - strategySums
+
+# Solver of the workers of solveMonteCarloCFR(), inherited from the parent
+# process when the pool forks, table included.
+workerSolver = None
+
+def monteCarloShard(args):
+    iterations, seed = args
+    workerSolver.rng.seed(seed)
+    workerSolver.original = {}
+    workerSolver.iterate(iterations)
+    return workerSolver.changes()
+
+# Runs |iterations| of MonteCarloCFR on |workers| processes. Every
+# |mergeEvery| iterations per worker, the workers send the slots they changed
+# and their changes are added up into |solver|'s table, which the workers
+# start the next epoch from. Seeded like simulateParallel().
+# Prints, after every merge, the iterations per second and how far the
+# average strategy moved (mean total variation distance over the slots
+# visited before the epoch, weighted by their strategy sums, None when no
+# slot was) and returns these statistics, one dict per epoch.
+def solveMonteCarloCFR(solver, iterations, workers=1, mergeEvery=10000, seed=None, verbose=True):
+    global workerSolver
+    seeds = random.Random(seed)
+    history = []
+    done = 0
+    previous = solver.table.averageStrategy()
+    previousWeights = solver.table.strategySums.sum(axis=1)
+    while done < iterations:
+        start = timeit.default_timer()
+        epoch = min(mergeEvery * workers, iterations - done)
+        sizes = [epoch // workers + (1 if i < epoch % workers else 0) for i in range(workers)]
+        shards = [(size, seeds.getrandbits(32)) for size in sizes if size]
+        if len(shards) == 1:
+            solver.rng.seed(shards[0][1])
+            solver.iterate(shards[0][0])
+            solver.original = {}
+        else:
+            workerSolver = solver
+            pool = multiprocessing.Pool(len(shards))
+            try:
+                changes = pool.map(monteCarloShard, shards)
+            finally:
+                pool.close()
+                pool.join()
+                workerSolver = None
+            solver.table.merge(changes)
+            solver.iterations += epoch
+        done += epoch
+        seconds = timeit.default_timer() - start
+
+        table = solver.table
+        weights = table.strategySums.sum(axis=1)
+        strategy = table.averageStrategy()
+        distance = 0.5 * np.abs(strategy - previous).sum(axis=1)
+        visited = np.where(previousWeights > 0, weights, 0.0)
+        previous, previousWeights = strategy, weights
+        stats = {
+            'iterations': solver.iterations,
+            'iterationsPerSecond': epoch / seconds,
+            'occupied': table.occupied(),
+            'strategyChange': float((distance * visited).sum() / visited.sum()) if visited.any() else None,
+        }
+        history.append(stats)
+        if verbose:
+            change = stats['strategyChange']
+            print('******* MCCFR iteration {iterations} *******'.format(**stats))
+            print('{iterationsPerSecond:.0f} iterations/s, {occupied} slots used, '
+                  'average strategy moved {change}'.format(
+                      change='n/a' if change is None else '{:.4f}'.format(change), **stats))
+    return history
+
+# Plays the average strategy of a MonteCarloCFR table in either seat.
+class MonteCarloCFRPlayer(Player):
+    def __init__(self, solver):
+        self.solver = solver
+
+    # Same as CFRPlayer.policy(), unnormalized.
+    def policy(self, game):
+        player = game.player()
+        if player == 'Dealer':
+            return ['draw_card'], [1.0]
+
+        state = game.state
+        hand = state['player1Hand'] if player == 'Player1' else state['player2Hand']
+        board = state['communityCards']
+        key = gamePublicKey(game)
+        if key not in self.solver.keyIds:
+            actions = game.legalActions(state)
+            return actions, [1.0] * len(actions)
+
+        privateKey = MonteCarloCFR.privateKeys(hand, board)[len(board) - FIRST_BOARD + 1]
+        table = self.solver.table
+        slot = table.slot(self.solver.infoSetKey(self.solver.keyIds[key], privateKey))
+        actions = self.solver.actions[key]
+        sums = table.strategySums[slot, :len(actions)].tolist()
+        return actions, sums if sum(sums) > 0 else [1.0] * len(actions)
+
+    def actionProbabilities(self, game):
+        actions, weights = self.policy(game)
+        total = float(sum(weights))
+        return dict((action, w / total) for action, w in zip(actions, weights))
+
+    def getAction(self, game):
+        return sampleAction(*self.policy(game))
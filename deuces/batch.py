@@ -0,0 +1,149 @@
+import numpy as np
+from card import Card
+from evaluator import Evaluator
+from lookup import LookupTable
+
+class BatchEvaluator(object):
+    """
+    Evaluates many hands at once with NumPy.
+
+    5 card hands are ranked with the flat arrays of FlatLookupTable, which
+    need nothing but integer arithmetic and array indexing and therefore 
+    vectorize directly:
+
+        1) flush_ranks: indexed by the 13 rank bits of a flush
+        2) unique_ranks: indexed by the rank bits of 5 distinct ranks
+        3) paired_ranks: indexed by the perfect hash of the prime product
+
+    6 and 7 card hands are ranked in a single pass, as Evaluator does one
+    hand at a time, with the best-of tables of LookupTable.six_and_seven():
+
+        4) flush_best_ranks: indexed by the rank bits of the flush suit, 
+           found with the suit counters of Evaluator._six_or_seven
+        5) unsuited_best_ranks: found by binary search of the prime product 
+           of all the cards in the sorted unsuited_best_products
+
+    Cards may be given either as the usual card integers or as indices in
+    0..51, where index = 4 * rank + suit with suits ordered s, h, d, c.
+    """
+
+    # how many hands are ranked at once, keeps the temporary (chunk, 7)
+    # arrays at a few megabytes
+    CHUNK_SIZE = 1 << 16
+
+    SUIT_COUNT_ADD = Evaluator.SUIT_COUNT_ADD
+    SUIT_COUNT_FLUSH = Evaluator.SUIT_COUNT_FLUSH
+
+    # rank class boundaries in the same order as LookupTable.MAX_TO_RANK_CLASS
+    RANK_CLASS_BOUNDS = np.array(sorted(LookupTable.MAX_TO_RANK_CLASS.keys()))
+
+    # card index => card integer
+    INDEX_TO_CARD = np.array([Card.new(r + s) for r in Card.STR_RANKS for s in 'shdc'],
+                             dtype=np.int64)
+
+    def __init__(self, flat_table, table=None):
+        """
+        Unless a LookupTable is given, the best-of tables for 6 and 7 card 
+        hands are taken from LookupTable.shared(). When the table was read 
+        from a binary file, the sorted unsuited products and their ranks 
+        are memory mapped from it, so processes share their pages.
+        """
+        self.flat = flat_table
+        self.flush_ranks = np.frombuffer(flat_table.flush_ranks, dtype=np.uint16)
+        self.unique_ranks = np.frombuffer(flat_table.unique_ranks, dtype=np.uint16)
+        self.paired_ranks = np.frombuffer(flat_table.paired_ranks, dtype=np.uint16)
+        self.displacements = np.frombuffer(flat_table.displacements, dtype=np.uint16).astype(np.int64)
+
+        table = table or LookupTable.shared()
+        table.six_and_seven()
+
+        self.flush_best_ranks = np.zeros(1 << 13, dtype=np.uint16)
+        bits, ranks = zip(*table.flush_best_lookup.iteritems())
+        self.flush_best_ranks[list(bits)] = ranks
+
+        # the products of 7 primes up to 41 stay below 2^38
+        if table.filepath:
+            products, ranks = LookupTable.memory_map(table.filepath)['unsuited_best_lookup']
+            self.unsuited_best_products = products.view(np.int64)
+            self.unsuited_best_ranks = ranks
+        else:
+            items = sorted(table.unsuited_best_lookup.iteritems())
+            self.unsuited_best_products = np.array([p for p, r in items], dtype=np.int64)
+            self.unsuited_best_ranks = np.array([r for p, r in items], dtype=np.uint16)
+
+    @staticmethod
+    def to_card_ints(cards):
+        """
+        Converts an array of card integers or card indices in 0..51 to
+        an int64 array of card integers.
+        """
+        cards = np.asarray(cards, dtype=np.int64)
+        if cards.size and cards.max() < 52:
+            return BatchEvaluator.INDEX_TO_CARD[cards]
+        return cards
+
+    def evaluate(self, hands, boards):
+        """
+        Ranks N hands given (N, h) hole cards and (N, b) boards, with
+        5 <= h + b <= 7. Returns an int array of N ranks in [1, 7462].
+        """
+        cards = np.hstack((self.to_card_ints(hands), self.to_card_ints(boards)))
+        if cards.ndim != 2 or cards.shape[1] not in (5, 6, 7):
+            raise Exception("Invalid batch shape, need 5, 6 or 7 cards per hand")
+
+        rank = self._five if cards.shape[1] == 5 else self._six_or_seven
+        ranks = np.empty(cards.shape[0], dtype=np.uint16)
+        for start in xrange(0, cards.shape[0], self.CHUNK_SIZE):
+            stop = start + self.CHUNK_SIZE
+            ranks[start:stop] = rank(cards[start:stop])
+
+        return ranks
+
+    def _six_or_seven(self, cards):
+        """
+        Vectorized Evaluator._six_or_seven over an (N, 6) or (N, 7) array 
+        of card integers.
+        """
+        # the suit counters of Evaluator, one 4 bit counter per suit
+        shifts = (cards >> 10) & 0x3C
+        suits = np.add.reduce(1 << shifts, axis=1)
+        flush = (suits + self.SUIT_COUNT_ADD) & self.SUIT_COUNT_FLUSH
+        in_flush = (flush[:, np.newaxis] >> shifts) & 8
+        handOR = np.bitwise_or.reduce(np.where(in_flush, cards >> 16, 0), axis=1)
+
+        p = np.multiply.reduce(cards & 0xFF, axis=1)
+        ranks = self.unsuited_best_ranks[np.searchsorted(self.unsuited_best_products, p)]
+        return np.where(flush != 0, self.flush_best_ranks[handOR], ranks)
+
+    def _five(self, cards):
+        """
+        Vectorized FlatLookupTable.five over an (N, 5) array of card integers.
+        """
+        suited = np.bitwise_and.reduce(cards, axis=1) & 0xF000
+        handOR = np.bitwise_or.reduce(cards, axis=1) >> 16
+
+        # the products stay below 2^27 and the multipliers below 2^32, so 
+        # the hash fits comfortably in int64
+        p = np.multiply.reduce(cards & 0xFF, axis=1)
+        n = self.flat.size
+        slot = (((p * self.flat.slot_multiplier) & 0xFFFFFFFF) % n 
+             + self.displacements[((p * self.flat.bucket_multiplier) & 0xFFFFFFFF) >> self.flat.shift]) % n
+
+        ranks = self.unique_ranks[handOR]
+        ranks = np.where(ranks == 0, self.paired_ranks[slot], ranks)
+        return np.where(suited != 0, self.flush_ranks[handOR], ranks)
+
+    def get_rank_class(self, ranks):
+        """
+        Vectorized Evaluator.get_rank_class.
+        """
+        ranks = np.asarray(ranks)
+        if ranks.size and (ranks.min() < 0 or ranks.max() > LookupTable.MAX_HIGH_CARD):
+            raise Exception("Inavlid hand rank, cannot return rank class")
+        return np.searchsorted(self.RANK_CLASS_BOUNDS, ranks) + 1
+
+    def get_five_card_rank_percentage(self, ranks):
+        """
+        Vectorized Evaluator.get_five_card_rank_percentage.
+        """
+        return np.asarray(ranks, dtype=np.float64) / float(LookupTable.MAX_HIGH_CARD)
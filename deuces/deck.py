@@ -1,25 +1,51 @@
-from random import shuffle
+import copy
+import random
 from card import Card
 
 class Deck:
     """
-    Class representing a deck. The first time we create, we seed the static 
+    Class representing a deck. The first time we create, we seed the static
     deck with the list of unique card integers. Each object instantiated simply
-    makes a copy of this object and shuffles it. 
+    makes a copy of this object once and keeps reusing it.
+
+    Shuffling is done lazily with a partial Fisher-Yates shuffle: the cards
+    left in the deck are self.cards[:self.remaining], and each draw swaps a
+    random one of them to the end of that range and deals it. A game that
+    only draws 9 cards therefore only does 9 swaps, and shuffle() just makes
+    all 52 cards available again.
+
+    Cards put back with putBack() sit on top of the deck and are drawn
+    again, last one first, before any new random card.
+
+    An explicit random.Random instance can be given for reproducible deals,
+    otherwise the global random module is used.
     """
     _FULL_DECK = []
 
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = rng or random
+        self.cards = Deck.GetFullDeck()
         self.shuffle()
 
     def shuffle(self):
-        # and then shuffle
-        self.cards = Deck.GetFullDeck()
-        shuffle(self.cards)
+        # self.cards always holds all 52 cards in some order, so there is
+        # nothing to copy or reorder here
+        self.remaining = len(self.cards)
+        self.top = []
 
     def draw(self, n=1):
         if n == 1:
-            return self.cards.pop(0)
+            if self.top:
+                return self.top.pop()
+
+            # one step of Fisher-Yates
+            last = self.remaining - 1
+            i = int(self.rng.random() * self.remaining)
+            card = self.cards[i]
+            self.cards[i] = self.cards[last]
+            self.cards[last] = card
+            self.remaining = last
+            return card
 
         cards = []
         for i in range(n):
@@ -28,10 +54,21 @@ class Deck:
 
     def putBack(self, cards):
         for card in cards:
-            self.cards.insert(0, card)
+            self.top.append(card)
+
+    def __deepcopy__(self, memo):
+        # copies share the random number generator, which may well be
+        # the random module itself and cannot be copied anyway
+        deck = copy.copy(self)
+        deck.cards = list(self.cards)
+        deck.top = list(self.top)
+        return deck
+
+    def __len__(self):
+        return len(self.top) + self.remaining
 
     def __str__(self):
-        return Card.print_pretty_cards(self.cards)
+        return Card.print_pretty_cards(self.top[::-1] + self.cards[:self.remaining])
 
     @staticmethod
     def GetFullDeck():
@@ -43,4 +80,4 @@ class Deck:
             for suit,val in Card.CHAR_SUIT_TO_INT_SUIT.iteritems():
                 Deck._FULL_DECK.append(Card.new(rank + suit))
 
-        return list(Deck._FULL_DECK)
\ No newline at end of file
+        return list(Deck._FULL_DECK)
@@ -0,0 +1,450 @@
+import mmap
+import os
+import struct
+from array import array
+from card import Card
+from lookup import LookupTable
+
+class EquityTable(object):
+    """
+    Equity of a hand against a single random hand, with the board run out
+    to the river: the probability of winning plus half the probability of
+    a tie. Each table is indexed so that a lookup is a single array access:
+
+        preflop     the 169 suit isomorphic starting hands, see
+                    preflop_class()
+        flop_class  the 1,286,792 suit isomorphic hand + flop classes, by
+                    HandIndexer.for_street(3) id
+        flop        the rank of the best 5 cards of hand + 3 card board
+        turn        the rank of the best 5 cards of hand + 4 card board
+        river       the rank of the best 5 cards of hand + 5 card board
+
+    flop_class is the one to use on the flop: each class is run out on its
+    own, so draws count, e.g. a flush draw with two overcards is a favourite
+    although it ranks as ace high. The rank tables average the equity over
+    all the deals that reach a rank, which folds draws into the rank they
+    currently make: the flop and turn rank tables ignore draws, and are
+    only a recalibration of the rank. rank_equity() reads them, for callers
+    that already have a rank; equity() uses flop_class when it was built.
+
+    The tables are built offline by Monte Carlo with build() (NumPy needed),
+    flop_class taking a few minutes, and saved with write_table_to_disk().
+    Reading them back needs neither NumPy nor a rebuild.
+    """
+
+    STREETS = ['preflop', 'flop', 'turn', 'river']
+    TABLES = STREETS + ['flop_class']
+    BOARD_SIZE_TO_STREET = {0: 'preflop', 3: 'flop', 4: 'turn', 5: 'river'}
+
+    # process wide table handed out by shared()
+    _SHARED = None
+
+    # environment variable naming the binary table file used by shared()
+    PATH_ENV_VAR = 'DEUCES_EQUITY_TABLE'
+
+    # binary file layout, see write_table_to_disk()
+    FILE_MAGIC = 'DEUCESEQ'
+    FILE_VERSION = 2
+
+    # random opponent hands and run outs per flop class in build()
+    FLOP_SAMPLES = 64
+
+    def __init__(self, tables):
+        """
+        Wraps a dict of street => sequence of equities, 169 entries for
+        preflop and LookupTable.MAX_HIGH_CARD + 1 for the other streets,
+        plus optionally one per flop class for flop_class.
+        """
+        for street in EquityTable.STREETS:
+            setattr(self, street, array('f', tables[street]))
+        self.flop_class = array('f', tables.get('flop_class', ()))
+        self.by_board_size = dict((size, getattr(self, street))
+            for size, street in EquityTable.BOARD_SIZE_TO_STREET.iteritems())
+
+    @staticmethod
+    def shared(filepath=None, deals=1 << 20, flop_samples=None):
+        """
+        Returns the process wide table, creating it on first call.
+
+        If filepath (or the DEUCES_EQUITY_TABLE environment variable) names
+        an existing file it is read, otherwise a table is built from deals
+        random deals and written there if given. By default flop_class is
+        only built when the table is written to a file (a few minutes):
+        without a file only the rank tables are built, in seconds, and
+        equity() falls back to them on the flop.
+        """
+        if EquityTable._SHARED is not None:
+            return EquityTable._SHARED
+
+        filepath = filepath or os.environ.get(EquityTable.PATH_ENV_VAR)
+        if filepath and os.path.exists(filepath):
+            table = EquityTable.read_table_from_disk(filepath)
+        else:
+            if flop_samples is None:
+                flop_samples = EquityTable.FLOP_SAMPLES if filepath else 0
+            table = EquityTable.build(deals, flop_samples=flop_samples)
+            if filepath:
+                table.write_table_to_disk(filepath)
+
+        EquityTable._SHARED = table
+        return table
+
+    @staticmethod
+    def preflop_class(hand):
+        """
+        Index of a 2 card hand among the 169 starting hands: the cell of
+        the usual 13 x 13 grid, with suited hands above the diagonal,
+        offsuit hands below it and pairs on it.
+        """
+        r1 = Card.get_rank_int(hand[0])
+        r2 = Card.get_rank_int(hand[1])
+        high, low = max(r1, r2), min(r1, r2)
+        if Card.get_suit_int(hand[0]) == Card.get_suit_int(hand[1]):
+            return high * 13 + low
+        return low * 13 + high
+
+    def rank_equity(self, rank, board_size):
+        """
+        Equity of a hand ranked rank on a board of board_size cards.
+        """
+        return self.by_board_size[board_size][rank]
+
+    def equity(self, hand, board, evaluator=None):
+        """
+        Equity of a 2 card hand on an empty, 3, 4 or 5 card board, by flop
+        class on the flop if flop_class was built. Pass an evaluator, or a
+        precomputed rank to rank_equity(), to skip ranking the hand with a
+        default one.
+        """
+        if not board:
+            return self.preflop[EquityTable.preflop_class(hand)]
+        if len(board) == 3 and self.flop_class:
+            from isomorphism import HandIndexer
+            return self.flop_class[HandIndexer.for_street(3).index(hand, board)]
+        if evaluator is None:
+            from evaluator import Evaluator
+            evaluator = Evaluator()
+        return self.by_board_size[len(board)][evaluator.evaluate(hand, board)]
+
+    @staticmethod
+    def build(deals=1 << 20, seed=0, min_samples=64, chunk_size=1 << 16, flop_samples=FLOP_SAMPLES):
+        """
+        Estimates the rank tables from random deals of two hands and a 
+        board. Both players' hands are counted, so every deal gives two 
+        samples per street. Ranks seen fewer than min_samples times are 
+        pooled with their neighbours (see _pool()), which fills in the rare
+        and the impossible ones. flop_class is estimated with flop_samples
+        run outs per class (see build_flop_classes()), or left out if 0.
+
+        Requires NumPy.
+        """
+        import numpy as np
+        from batch import BatchEvaluator
+        from flatlookup import FlatLookupTable
+
+        batch = BatchEvaluator(FlatLookupTable.shared())
+        rng = np.random.RandomState(seed)
+        size = LookupTable.MAX_HIGH_CARD + 1
+        sums = dict((street, np.zeros(169 if street == 'preflop' else size)) for street in EquityTable.STREETS)
+        counts = dict((street, np.zeros(169 if street == 'preflop' else size)) for street in EquityTable.STREETS)
+
+        for start in xrange(0, deals, chunk_size):
+            n = min(chunk_size, deals - start)
+
+            # card indices in 0..51, 4 * rank + suit, 9 distinct per deal
+            cards = rng.rand(n, 52).argsort(axis=1)[:, :9]
+            board = cards[:, 4:]
+            ranks = {}
+            for player, hand in ((0, cards[:, :2]), (1, cards[:, 2:4])):
+                for street, board_size in (('flop', 3), ('turn', 4), ('river', 5)):
+                    ranks[player, street] = batch.evaluate(hand, board[:, :board_size]).astype(np.int64)
+
+                r1, r2 = hand[:, 0] // 4, hand[:, 1] // 4
+                suited = hand[:, 0] % 4 == hand[:, 1] % 4
+                high, low = np.maximum(r1, r2), np.minimum(r1, r2)
+                ranks[player, 'preflop'] = np.where(suited, high * 13 + low, low * 13 + high)
+
+            first, second = ranks[0, 'river'], ranks[1, 'river']
+            won = (first < second) + 0.5 * (first == second)
+            for player, outcome in ((0, won), (1, 1.0 - won)):
+                for street in EquityTable.STREETS:
+                    index = ranks[player, street]
+                    sums[street] += np.bincount(index, weights=outcome, minlength=len(sums[street]))
+                    counts[street] += np.bincount(index, minlength=len(counts[street]))
+
+        tables = {'preflop': sums['preflop'] / np.maximum(counts['preflop'], 1)}
+        for street in EquityTable.STREETS[1:]:
+            tables[street] = EquityTable._pool(sums[street], counts[street], min_samples)
+        if flop_samples:
+            tables['flop_class'] = EquityTable.build_flop_classes(flop_samples, seed)
+        return EquityTable(tables)
+
+    @staticmethod
+    def build_flop_classes(samples=FLOP_SAMPLES, seed=0, chunk_size=1 << 12):
+        """
+        Estimates the equity of every flop class of HandIndexer.for_street(3)
+        on its canonical hand and board, each against samples random 
+        opponent hands and turn and river cards. With 64 samples the 
+        standard error is about 0.06 per class, and the 1.3M classes take
+        about 2.5 minutes.
+
+        Requires NumPy.
+        """
+        import numpy as np
+        from batch import BatchEvaluator
+        from flatlookup import FlatLookupTable
+        from isomorphism import HandIndexer
+
+        batch = BatchEvaluator(FlatLookupTable.shared())
+        indexer = HandIndexer.for_street(3)
+        card_to_index = dict((int(c), i) for i, c in enumerate(BatchEvaluator.INDEX_TO_CARD))
+        rng = np.random.RandomState(seed)
+        equities = np.zeros(indexer.size(1))
+
+        for start in xrange(0, len(equities), chunk_size):
+            ids = xrange(start, min(start + chunk_size, len(equities)))
+            n = len(ids)
+
+            # canonical hand and flop of each class, as card indices
+            known = np.array([[card_to_index[c] for cards in indexer.unindex(1, i) for c in cards]
+                              for i in ids])
+            live = np.ones((n, 52), dtype=bool)
+            live[np.arange(n)[:, np.newaxis], known] = False
+            remaining = np.nonzero(live)[1].reshape(n, 47)
+
+            # 4 distinct positions among the remaining cards per sample: the
+            # opponent's hand, the turn and the river
+            rows = np.repeat(np.arange(n), samples)
+            positions = rng.randint(0, 47, (len(rows), 4))
+            while True:
+                ordered = np.sort(positions, axis=1)
+                repeated = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+                if not repeated.any():
+                    break
+                positions[repeated] = rng.randint(0, 47, (repeated.sum(), 4))
+            extra = remaining[rows[:, np.newaxis], positions]
+
+            board = np.hstack((known[rows, 2:], extra[:, 2:]))
+            ours = batch.evaluate(known[rows, :2], board)
+            theirs = batch.evaluate(extra[:, :2], board)
+            won = (ours < theirs) + 0.5 * (ours == theirs)
+            equities[start:start + n] = won.reshape(n, samples).mean(axis=1)
+
+        return equities
+
+    @staticmethod
+    def _pool(sums, counts, min_samples):
+        """
+        Averages runs of consecutive ranks until every run has at least
+        min_samples samples. Equity falls with rank, so neighbouring ranks
+        are the best stand-ins for each other.
+        """
+        equities = [0.0] * len(sums)
+        runs = []
+        run_start, run_sum, run_count = 1, 0.0, 0
+        for rank in xrange(1, len(sums)):
+            run_sum += sums[rank]
+            run_count += counts[rank]
+            if run_count >= min_samples:
+                runs.append([run_start, rank + 1, run_sum, run_count])
+                run_start, run_sum, run_count = rank + 1, 0.0, 0
+
+        # whatever is left over joins the last run
+        if run_start < len(sums):
+            if runs:
+                runs[-1][1] = len(sums)
+                runs[-1][2] += run_sum
+                runs[-1][3] += run_count
+            else:
+                runs.append([run_start, len(sums), run_sum, run_count])
+
+        for start, stop, run_sum, run_count in runs:
+            for rank in xrange(start, stop):
+                equities[rank] = run_sum / max(run_count, 1)
+        return equities
+
+    def write_table_to_disk(self, filepath):
+        """
+        Writes the tables to disk in a compact binary format:
+
+            header    8 byte magic, uint32 version, uint32 number of tables
+            index     per table: 24 byte name, uint32 count, uint32 unused,
+                      uint64 offset
+            data      per table: count float32 equities, padded to 8 bytes
+
+        All numbers are little endian. The file is written next to its
+        destination and renamed, so concurrent readers never see a partial
+        table.
+        """
+        header = struct.Struct('<8sII')
+        entry = struct.Struct('<24sIIQ')
+        offset = header.size + entry.size * len(EquityTable.TABLES)
+
+        index = []
+        data = []
+        for street in EquityTable.TABLES:
+            table = getattr(self, street)
+            values = struct.pack('<%df' % len(table), *table)
+            values += '\0' * (-len(values) % 8)
+
+            index.append(entry.pack(street, len(table), 0, offset))
+            data.append(values)
+            offset += len(values)
+
+        tmp_filepath = '%s.%d.tmp' % (filepath, os.getpid())
+        with open(tmp_filepath, 'wb') as f:
+            f.write(header.pack(EquityTable.FILE_MAGIC, EquityTable.FILE_VERSION, len(index)))
+            f.write(''.join(index))
+            f.write(''.join(data))
+        os.rename(tmp_filepath, filepath)
+
+    @staticmethod
+    def read_table_index(buf):
+        """
+        Parses the header of a binary table, returning a dict of
+        table name => (count, offset).
+        """
+        header = struct.Struct('<8sII')
+        entry = struct.Struct('<24sIIQ')
+
+        magic, version, num_tables = header.unpack_from(buf, 0)
+        if magic != EquityTable.FILE_MAGIC or version != EquityTable.FILE_VERSION:
+            raise Exception("Invalid equity table file")
+
+        index = {}
+        for i in xrange(num_tables):
+            name, count, _, offset = entry.unpack_from(buf, header.size + i * entry.size)
+            index[name.rstrip('\0')] = (count, offset)
+        return index
+
+    @staticmethod
+    def read_table_from_disk(filepath):
+        """
+        Loads a table written by write_table_to_disk().
+        """
+        with open(filepath, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        tables = {}
+        for street, (count, offset) in EquityTable.read_table_index(buf).iteritems():
+            tables[street] = struct.unpack_from('<%df' % count, buf, offset)
+
+        buf.close()
+        return EquityTable(tables)
+
+    @staticmethod
+    def memory_map(filepath):
+        """
+        Maps a table written by write_table_to_disk() as read only NumPy
+        arrays, returning a dict of table name => equities. The pages are
+        shared by every process mapping the same file.
+
+        Requires NumPy.
+        """
+        import numpy as np
+
+        with open(filepath, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        arrays = {}
+        for street, (count, offset) in EquityTable.read_table_index(buf).iteritems():
+            arrays[street] = np.frombuffer(buf, dtype='<f4', count=count, offset=offset)
+        return arrays
+
+class MonteCarloEquity(object):
+    """
+    Estimates the equity of a hand by sampling, for when the averages in
+    EquityTable are not precise enough, or the opponent's range is known.
+
+    Each batch deals the opponent's hand and the rest of the board from
+    the unseen cards in one go (NumPy random keys, argsorted per row, so
+    the cards of a row are distinct), ranks both hands with the flat
+    lookup table and counts the wins. Batches are drawn until the
+    confidence interval of the estimate is narrower than the tolerance.
+
+    Requires NumPy.
+    """
+
+    def __init__(self, seed=None, batch_size=2048, max_samples=1 << 17):
+        import numpy as np
+        from batch import BatchEvaluator
+        from flatlookup import FlatLookupTable
+
+        self.rng = np.random.RandomState(seed)
+        self.batch = BatchEvaluator(FlatLookupTable.shared())
+        self.batch_size = batch_size
+        self.max_samples = max_samples
+        self.card_to_index = dict((card, i) for i, card in enumerate(BatchEvaluator.INDEX_TO_CARD.tolist()))
+
+    def equity(self, hand, board, opponent_range=None, dead=(), tolerance=0.01, z=1.96):
+        """
+        Equity of hand against one opponent, see estimate().
+        """
+        return self.estimate(hand, board, opponent_range, dead, tolerance, z)['equity']
+
+    def estimate(self, hand, board, opponent_range=None, dead=(), tolerance=0.01, z=1.96):
+        """
+        Samples until z standard errors are within tolerance of the mean,
+        or max_samples is reached. Cards are the usual card integers:
+
+            hand            the hole cards
+            board           0 to 5 community cards
+            opponent_range  the opponent's possible hands, each a list of
+                            card integers, equally likely; any hand by
+                            default
+            dead            cards known to be out of play
+
+        Returns a dict with the equity, its standard error and the number
+        of samples.
+        """
+        import numpy as np
+
+        known = set(hand) | set(board) | set(dead)
+        unseen = np.array([i for card, i in sorted(self.card_to_index.iteritems()) if card not in known])
+        position = dict((card, j) for j, card in enumerate(unseen.tolist()))
+
+        if opponent_range is not None:
+            # hands holding a card we can see cannot be out there
+            hands = [[self.card_to_index[c] for c in h] for h in opponent_range
+                     if not known.intersection(h)]
+            if not hands:
+                raise Exception("No hand in the opponent range is possible")
+            opponent_hands = np.array(hands)
+            opponent_positions = np.array([[position[i] for i in h] for h in hands])
+
+        hero = np.array([self.card_to_index[c] for c in hand])
+        known_board = np.array([self.card_to_index[c] for c in board], dtype=np.int64)
+        to_deal = 5 - len(board)
+
+        total, total_squares, samples = 0.0, 0.0, 0
+        while samples < self.max_samples:
+            n = min(self.batch_size, self.max_samples - samples)
+            keys = self.rng.rand(n, len(unseen))
+
+            if opponent_range is None:
+                order = keys.argsort(axis=1)[:, :2 + to_deal]
+                opponent = unseen[order[:, :2]]
+                runout = unseen[order[:, 2:]]
+            else:
+                # the opponent's cards sort last, so the runout avoids them
+                choice = self.rng.randint(len(opponent_hands), size=n)
+                opponent = opponent_hands[choice]
+                rows = np.arange(n)[:, np.newaxis]
+                keys[rows, opponent_positions[choice]] = 2.0
+                runout = unseen[keys.argsort(axis=1)[:, :to_deal]]
+
+            boards = np.hstack((np.tile(known_board, (n, 1)), runout))
+            mine = self.batch.evaluate(np.tile(hero, (n, 1)), boards)
+            theirs = self.batch.evaluate(opponent, boards)
+            outcome = (mine < theirs) + 0.5 * (mine == theirs)
+
+            total += outcome.sum()
+            total_squares += (outcome * outcome).sum()
+            samples += n
+
+            mean = total / samples
+            stderr = np.sqrt(max(total_squares / samples - mean * mean, 0.0) / samples)
+            if z * stderr < tolerance:
+                break
+
+        return {'equity': mean, 'stderr': stderr, 'samples': samples}
@@ -14,15 +14,65 @@ class Evaluator(object):
     all calculations are done with bit arithmetic and table lookups. 
     """
 
-    def __init__(self):
+    # suit counters for the single pass 6 and 7 card evaluator, each suit 
+    # counts its cards in its own nibble (see _six_or_seven)
+    SUIT_COUNT_ADD = (3 << 4) | (3 << 8) | (3 << 16) | (3 << 32)
+    SUIT_COUNT_FLUSH = (8 << 4) | (8 << 8) | (8 << 16) | (8 << 32)
+    FLUSH_SUIT = {
+        8 << 4 : 0x1000, # spades
+        8 << 8 : 0x2000, # hearts
+        8 << 16 : 0x4000, # diamonds
+        8 << 32 : 0x8000 # clubs
+    }
 
-        self.table = LookupTable()
-        
-        self.hand_size_map = {
-            5 : self._five,
-            6 : self._six,
-            7 : self._seven
-        }
+    def __init__(self, direct=True, table=None, flat=False):
+        """
+        With direct=True, 6 and 7 card hands are ranked in a single pass 
+        using the best-of tables from LookupTable.six_and_seven(). Otherwise 
+        every 5 card subset is ranked, as the original deuces did.
+
+        With flat=True, 5 card hands are ranked with the array based 
+        FlatLookupTable instead of the prime product dictionaries.
+
+        Unless a table is given, the process wide LookupTable.shared() is 
+        attached on first use, so creating an evaluator is nearly free.
+        """
+        if table is not None:
+            self.table = table
+            if direct:
+                table.six_and_seven()
+
+        if direct:
+            self.hand_size_map = {
+                5 : self._five,
+                6 : self._six_or_seven,
+                7 : self._six_or_seven
+            }
+        else:
+            self.hand_size_map = {
+                5 : self._five,
+                6 : self._six,
+                7 : self._seven
+            }
+
+        if flat:
+            self.hand_size_map[5] = self._five_flat
+
+        # NumPy backed batch engine, created on first use so that
+        # NumPy stays an optional dependency
+        self._batch = None
+
+    def __getattr__(self, name):
+        # only called for missing attributes, so after the first lookup
+        # the table is a plain instance attribute again
+        if name == 'table':
+            self.table = LookupTable.shared()
+            return self.table
+        if name == 'flat_table':
+            from flatlookup import FlatLookupTable
+            self.flat_table = FlatLookupTable.shared()
+            return self.flat_table
+        raise AttributeError(name)
 
     def evaluate(self, cards, board):
         """
@@ -34,6 +84,37 @@ class Evaluator(object):
         all_cards = cards + board
         return self.hand_size_map[len(all_cards)](all_cards)
 
+    def evaluate_batch(self, hands, boards):
+        """
+        Ranks many hands at once. Expects NumPy arrays (or nested lists) of 
+        shape (N, h) and (N, b) holding card integers or card indices in 
+        0..51, with 5 <= h + b <= 7, and returns an array of N ranks.
+
+        Requires NumPy.
+        """
+        return self.batch().evaluate(hands, boards)
+
+    def get_rank_class_batch(self, hand_ranks):
+        """
+        Returns an array of hand classes for an array of hand ranks. 
+        """
+        return self.batch().get_rank_class(hand_ranks)
+
+    def get_five_card_rank_percentage_batch(self, hand_ranks):
+        """
+        Scales an array of hand ranks to the [0.0, 1.0] range.
+        """
+        return self.batch().get_five_card_rank_percentage(hand_ranks)
+
+    def batch(self):
+        """
+        Returns the BatchEvaluator built on the flat lookup table.
+        """
+        if self._batch is None:
+            from batch import BatchEvaluator
+            self._batch = BatchEvaluator(self.flat_table, self.table)
+        return self._batch
+
     def _five(self, cards):
         """
         Performs an evalution given cards in integer form, mapping them to
@@ -53,6 +134,40 @@ class Evaluator(object):
             prime = Card.prime_product_from_hand(cards)
             return self.table.unsuited_lookup[prime]
 
+    def _five_flat(self, cards):
+        """
+        Same ranking as _five using FlatLookupTable's arrays.
+        """
+        return self.flat_table.five(cards)
+
+    def _six_or_seven(self, cards):
+        """
+        Ranks 6 or 7 cards in one pass. 
+
+        Each card adds one to the 4 bit counter of its suit, the counters 
+        sitting at bits 4, 8, 16 and 32 (the suit bits shifted up by 2). 
+        Adding 3 to every counter sets its top bit exactly when the suit 
+        holds 5 or more cards, i.e. a flush. In that case the rank bits of 
+        the flush suit index the best flush; otherwise the prime product of 
+        all the cards indexes the best hand made of the rank multiplicities.
+        """
+        product = 1
+        suits = 0
+        for c in cards:
+            product *= c & 0xFF
+            suits += 1 << ((c >> 10) & 0x3C)
+
+        flush = (suits + Evaluator.SUIT_COUNT_ADD) & Evaluator.SUIT_COUNT_FLUSH
+        if flush:
+            suit = Evaluator.FLUSH_SUIT[flush]
+            handOR = 0
+            for c in cards:
+                if c & suit:
+                    handOR |= c
+            return self.table.flush_best_lookup[handOR >> 16]
+
+        return self.table.unsuited_best_lookup[product]
+
     def _six(self, cards):
         """
         Performs five_card_eval() on all (6 choose 5) = 6 subsets
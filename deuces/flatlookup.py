@@ -0,0 +1,175 @@
+import itertools
+import random
+from array import array
+from card import Card
+from deck import Deck
+from lookup import LookupTable
+
+class FlatLookupTable(object):
+    """
+    The 5 card lookup tables of LookupTable rearranged into flat arrays, so
+    that ranking a hand is integer arithmetic plus an array index instead of
+    a big prime product and a dictionary lookup.
+
+    Hands are split three ways:
+
+        1) flushes: indexed directly by the 13 rank bits of the hand
+        2) unique ranks (straights and high cards): also 5 rank bits set,
+           so they get their own 8192 entry array indexed the same way
+        3) everything with a repeated rank (pairs up to quads): 4888 prime
+           products, indexed through a minimal perfect hash
+
+    The perfect hash is of the hash and displace kind: a multiplicative hash
+    of the prime product picks a bucket, and the bucket's displacement is
+    added to a second multiplicative hash to get a slot in [0, 4888). The
+    displacements are searched at build time so that no two products land
+    in the same slot.
+    """
+
+    MASK = 0xFFFFFFFF
+
+    # 2^12 buckets for 4888 keys, ~1.2 keys per bucket
+    BUCKET_BITS = 12
+
+    # odd multipliers known to give a perfect hash on the first attempt, 
+    # build_perfect_hash() falls back to a random search otherwise
+    BUCKET_MULTIPLIER = 0xd82c07cd
+    SLOT_MULTIPLIER = 0x629f6fbf
+
+    # process wide table handed out by shared()
+    _SHARED = None
+
+    def __init__(self, table, seed=0):
+
+        self.flush_ranks = array('H', [0]) * (1 << 13)
+        self.unique_ranks = array('H', [0]) * (1 << 13)
+
+        for ranks in itertools.combinations(Card.INT_RANKS, 5):
+            bits = 0
+            for r in ranks:
+                bits |= 1 << r
+            prime = Card.prime_product_from_rankbits(bits)
+            self.flush_ranks[bits] = table.flush_lookup[prime]
+            self.unique_ranks[bits] = table.unsuited_lookup[prime]
+
+        unique = set(Card.prime_product_from_rankbits(bits)
+                     for bits in xrange(1 << 13) if self.unique_ranks[bits])
+        paired = [(p, r) for p, r in table.unsuited_lookup.iteritems() if p not in unique]
+        self.build_perfect_hash(paired, seed)
+
+    @staticmethod
+    def shared():
+        """
+        Returns the process wide flat table, built on first call from
+        LookupTable.shared().
+        """
+        if FlatLookupTable._SHARED is None:
+            FlatLookupTable._SHARED = FlatLookupTable(LookupTable.shared())
+        return FlatLookupTable._SHARED
+
+    def build_perfect_hash(self, items, seed):
+        """
+        Searches bucket displacements so that every prime product in items
+        gets its own slot. If two products in a bucket share a base slot no
+        displacement can separate them, so we retry with new multipliers.
+        """
+        rng = random.Random(seed)
+        self.size = len(items)
+        self.shift = 32 - FlatLookupTable.BUCKET_BITS
+        self.bucket_multiplier = FlatLookupTable.BUCKET_MULTIPLIER
+        self.slot_multiplier = FlatLookupTable.SLOT_MULTIPLIER
+
+        while not self._displace(items):
+            self.bucket_multiplier = rng.getrandbits(32) | 1
+            self.slot_multiplier = rng.getrandbits(32) | 1
+
+    def _displace(self, items):
+        n = self.size
+        buckets = [[] for i in xrange(1 << FlatLookupTable.BUCKET_BITS)]
+        for p, rank in items:
+            buckets[((p * self.bucket_multiplier) & FlatLookupTable.MASK) >> self.shift].append(
+                (((p * self.slot_multiplier) & FlatLookupTable.MASK) % n, rank))
+
+        self.displacements = array('H', [0]) * len(buckets)
+        self.paired_ranks = array('H', [0]) * n
+        taken = [False] * n
+        free = range(n)
+
+        # biggest buckets first while the table is still empty
+        order = sorted(xrange(len(buckets)), key=lambda b: -len(buckets[b]))
+        for b in order:
+            keys = buckets[b]
+            if not keys:
+                break
+            if len(set(base for base, rank in keys)) != len(keys):
+                return False
+
+            # a single key can take any free slot
+            if len(keys) == 1:
+                while taken[free[-1]]:
+                    free.pop()
+                d = (free[-1] - keys[0][0]) % n
+            else:
+                for d in xrange(n):
+                    if not any(taken[(base + d) % n] for base, rank in keys):
+                        break
+                else:
+                    return False
+
+            self.displacements[b] = d
+            for base, rank in keys:
+                taken[(base + d) % n] = True
+                self.paired_ranks[(base + d) % n] = rank
+
+        return True
+
+    def slot(self, product):
+        """
+        Perfect hash of the prime product of a hand with a repeated rank.
+        """
+        return (((product * self.slot_multiplier) & FlatLookupTable.MASK) % self.size
+                + self.displacements[((product * self.bucket_multiplier) & FlatLookupTable.MASK) >> self.shift]) % self.size
+
+    def five(self, cards):
+        """
+        Same as Evaluator._five, without the prime product dictionaries.
+        """
+        handOR = (cards[0] | cards[1] | cards[2] | cards[3] | cards[4]) >> 16
+
+        # if flush
+        if cards[0] & cards[1] & cards[2] & cards[3] & cards[4] & 0xF000:
+            return self.flush_ranks[handOR]
+
+        rank = self.unique_ranks[handOR]
+        if rank:
+            return rank
+
+        # the perfect hash, inlined from slot()
+        p = (cards[0] & 0xFF) * (cards[1] & 0xFF) * (cards[2] & 0xFF) \
+          * (cards[3] & 0xFF) * (cards[4] & 0xFF)
+        n = self.size
+        return self.paired_ranks[(((p * self.slot_multiplier) & 0xFFFFFFFF) % n
+                + self.displacements[((p * self.bucket_multiplier) & 0xFFFFFFFF) >> self.shift]) % n]
+
+    def verify(self, table):
+        """
+        Cross checks all 2,598,960 five card hands against the prime product
+        dictionaries of table, raising on the first mismatch. Returns the
+        number of hands checked.
+        """
+        checked = 0
+        for cards in itertools.combinations(Deck.GetFullDeck(), 5):
+
+            if cards[0] & cards[1] & cards[2] & cards[3] & cards[4] & 0xF000:
+                handOR = (cards[0] | cards[1] | cards[2] | cards[3] | cards[4]) >> 16
+                expected = table.flush_lookup[Card.prime_product_from_rankbits(handOR)]
+            else:
+                expected = table.unsuited_lookup[Card.prime_product_from_hand(cards)]
+
+            rank = self.five(cards)
+            if rank != expected:
+                raise Exception("Flat table mismatch for %s: %d != %d" % (
+                    [Card.int_to_str(c) for c in cards], rank, expected))
+            checked += 1
+
+        return checked
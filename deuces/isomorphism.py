@@ -0,0 +1,318 @@
+from bisect import bisect_right
+from card import Card
+
+RANKS = 13
+SUITS = 4
+
+# suit bit of a card int (Card.get_suit_int) => suit index, in the order
+# s, h, d, c as in the batch evaluator's card indices
+SUIT_BIT_TO_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}
+INDEX_TO_CARD = [Card.new(r + s) for r in Card.STR_RANKS for s in 'shdc']
+
+POPCOUNT = [bin(i).count('1') for i in xrange(1 << RANKS)]
+
+def choose(n, k):
+    if k < 0 or k > n:
+        return 0
+    result = 1
+    for i in xrange(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+NCR_RANKS = [[choose(n, k) for k in xrange(RANKS + 1)] for n in xrange(RANKS + 1)]
+
+# colexicographic index of a set of ranks among the sets of the same size,
+# and back
+RANK_SET_TO_INDEX = [0] * (1 << RANKS)
+INDEX_TO_RANK_SET = [[0] * choose(RANKS, k) for k in xrange(RANKS + 1)]
+for rank_set in xrange(1 << RANKS):
+    rest, j = rank_set, 1
+    while rest:
+        low = rest & -rest
+        RANK_SET_TO_INDEX[rank_set] += NCR_RANKS[low.bit_length() - 1][j]
+        rest ^= low
+        j += 1
+    INDEX_TO_RANK_SET[POPCOUNT[rank_set]][RANK_SET_TO_INDEX[rank_set]] = rank_set
+
+def multiset_index(values):
+    """
+    Index of a multiset of ints (a sorted list) among the multisets of the
+    same size, the combinatorial number system with repetition.
+    """
+    return sum(choose(v + k, k + 1) for k, v in enumerate(values))
+
+class HandIndexer(object):
+    """
+    Maps cards dealt in rounds to a dense integer id among the deals that
+    are the same up to a permutation of the suits. The cards of each round
+    are a set, the rounds are kept apart. for_street() gives the indexers
+    of a hand and board, the board being a set, one id range per street:
+
+        preflop     169 ids (2 cards)
+        flop        1,286,792 ids (2 + 3 cards)
+        turn        13,960,050 ids (2 + 4 cards)
+        river       123,156,254 ids (2 + 5 cards)
+
+    Anything keyed by hand and board, such as a cache, a table or a log,
+    can be keyed by these ids instead, and is up to 24 times smaller.
+    HandIndexer((2, 3, 1, 1)) also tells the turn and river cards from the
+    flop (55,190,538 turn and 2,428,287,420 river ids), and gives the ids
+    of all the streets of a deal in one pass with index_rounds().
+
+    This is the indexing algorithm of Kevin Waugh, "A Fast and Optimal Hand
+    Isomorphism Algorithm" (2013). For each suit it ranks the set of ranks
+    dealt in that suit on each street. It then orders the suits by how many
+    cards of each street they hold (the suit configuration) and combines
+    their ranks, suits with the same configuration being an unordered
+    multiset. The per configuration offsets and sizes are tabulated once
+    per indexer; index() is then a few dozen integer operations and no
+    lookup of the hand itself.
+
+        >>> indexer = HandIndexer.for_street(len(board))
+        >>> i = indexer.index(hand, board)
+        >>> hand, board = indexer.unindex(indexer.rounds - 1, i)
+    """
+
+    # process wide indexers handed out by shared(), by cards per round
+    _SHARED = {}
+
+    def __init__(self, cards_per_round=(2, 3, 1, 1)):
+        """
+        Tabulates the suit configurations of each round, cards_per_round
+        being the number of cards dealt in each: hole cards first.
+        """
+        self.cards_per_round = list(cards_per_round)
+        self.rounds = len(cards_per_round)
+
+        # configurations[r]: sorted tuples of the number of cards per suit,
+        # packed 4 bits per round, first round highest, suits in decreasing
+        # order of these counts
+        self.configurations = []
+        self.configuration_ids = []
+        self.offsets = []
+        self.suit_sizes = []
+        self.groups = []
+        self.sizes = []
+        for r in xrange(self.rounds):
+            configurations = sorted(self._enumerate_configurations(r))
+            self.configurations.append(configurations)
+            self.configuration_ids.append(dict((c, i) for i, c in enumerate(configurations)))
+
+            offsets, suit_sizes, groups = [], [], []
+            total = 0
+            for configuration in configurations:
+                sizes = [self._suit_size(count, r) for count in configuration]
+                # runs of suits with the same counts
+                runs = []
+                i = 0
+                while i < SUITS:
+                    j = i + 1
+                    while j < SUITS and configuration[j] == configuration[i]:
+                        j += 1
+                    runs.append((i, j - i))
+                    i = j
+                offsets.append(total)
+                suit_sizes.append(sizes)
+                groups.append(runs)
+                size = 1
+                for start, length in runs:
+                    size *= choose(sizes[start] + length - 1, length)
+                total += size
+            self.offsets.append(offsets)
+            self.suit_sizes.append(suit_sizes)
+            self.groups.append(groups)
+            self.sizes.append(total)
+
+    @staticmethod
+    def shared(cards_per_round=(2, 3, 1, 1)):
+        """
+        Returns the process wide indexer of cards_per_round, creating it on
+        first call.
+        """
+        cards_per_round = tuple(cards_per_round)
+        indexer = HandIndexer._SHARED.get(cards_per_round)
+        if indexer is None:
+            indexer = HandIndexer._SHARED[cards_per_round] = HandIndexer(cards_per_round)
+        return indexer
+
+    @staticmethod
+    def for_street(board_size):
+        """
+        Returns the process wide indexer of 2 hole cards and a board of
+        board_size cards (0 for preflop).
+        """
+        return HandIndexer.shared((2, board_size) if board_size else (2,))
+
+    def _enumerate_configurations(self, r):
+        configurations = [(0,) * SUITS]
+        for j in xrange(r + 1):
+            shift = 4 * (self.rounds - j - 1)
+            extended = []
+            for counts in self._compositions(self.cards_per_round[j]):
+                for configuration in configurations:
+                    c = tuple(configuration[s] | counts[s] << shift for s in xrange(SUITS))
+                    if all(self._total(c[s]) <= RANKS for s in xrange(SUITS)):
+                        extended.append(c)
+            configurations = extended
+        return set(c for c in configurations if list(c) == sorted(c, reverse=True))
+
+    @staticmethod
+    def _compositions(n, parts=SUITS):
+        if parts == 1:
+            yield (n,)
+            return
+        for first in xrange(n + 1):
+            for rest in HandIndexer._compositions(n - first, parts - 1):
+                yield (first,) + rest
+
+    def _total(self, count):
+        return sum(count >> 4 * j & 0xf for j in xrange(self.rounds))
+
+    def _suit_size(self, count, r):
+        # number of ways to deal a suit's cards given its counts up to round r
+        size, remaining = 1, RANKS
+        for j in xrange(r + 1):
+            n = count >> 4 * (self.rounds - j - 1) & 0xf
+            size *= NCR_RANKS[remaining][n]
+            remaining -= n
+        return size
+
+    def size(self, round):
+        """
+        Number of ids of round round, e.g. size(1) for the flop.
+        """
+        return self.sizes[round]
+
+    def index(self, hand, board=()):
+        """
+        Id of the hand (the first round's cards) and the board (the cards
+        of the next rounds, in dealing order), among the ids of the last
+        round they complete.
+        """
+        cards = list(hand) + list(board)
+        return self.index_rounds(cards, self.round_of(len(cards)) + 1)[-1]
+
+    def round_of(self, num_cards):
+        """
+        The round that is complete once num_cards cards are dealt.
+        """
+        total = 0
+        for r, n in enumerate(self.cards_per_round):
+            total += n
+            if total == num_cards:
+                return r
+        raise Exception("{} cards do not complete a round of {}".format(num_cards, self.cards_per_round))
+
+    def index_rounds(self, cards, rounds=None):
+        """
+        Ids of the first rounds rounds (all of them by default) of cards,
+        all the rounds' cards in dealing order: [preflop id, flop id, ...].
+        """
+        rounds = self.rounds if rounds is None else rounds
+        used = [0] * SUITS
+        suit_index = [0] * SUITS
+        suit_multiplier = [1] * SUITS
+        counts = [0] * SUITS
+        indices = []
+        start = 0
+        for r in xrange(rounds):
+            ranks = [0] * SUITS
+            shifted = [0] * SUITS
+            for card in cards[start:start + self.cards_per_round[r]]:
+                suit = SUIT_BIT_TO_INDEX[card >> 12 & 0xf]
+                bit = 1 << (card >> 8 & 0xf)
+                ranks[suit] |= bit
+                # rank among the ranks of the suit not dealt yet
+                shifted[suit] |= bit >> POPCOUNT[(bit - 1) & used[suit]]
+            start += self.cards_per_round[r]
+
+            shift = 4 * (self.rounds - r - 1)
+            for s in xrange(SUITS):
+                n = POPCOUNT[ranks[s]]
+                suit_index[s] += suit_multiplier[s] * RANK_SET_TO_INDEX[shifted[s]]
+                suit_multiplier[s] *= NCR_RANKS[RANKS - POPCOUNT[used[s]]][n]
+                used[s] |= ranks[s]
+                counts[s] |= n << shift
+
+            order = sorted(xrange(SUITS), key=counts.__getitem__, reverse=True)
+            configuration = self.configuration_ids[r][tuple(counts[s] for s in order)]
+            index = self.offsets[r][configuration]
+            multiplier = 1
+            for first, length in self.groups[r][configuration]:
+                group = order[first:first + length]
+                if length == 1:
+                    part = suit_index[group[0]]
+                else:
+                    part = multiset_index(sorted(suit_index[s] for s in group))
+                index += multiplier * part
+                multiplier *= choose(suit_multiplier[group[0]] + length - 1, length)
+            indices.append(index)
+        return indices
+
+    def unindex(self, round, index):
+        """
+        The canonical (hand, board) card ints of id index of round round.
+        Suits are assigned s, h, d, c in decreasing order of their counts.
+        """
+        if not 0 <= index < self.sizes[round]:
+            raise Exception("Invalid index {} for round {}".format(index, round))
+
+        configuration = bisect_right(self.offsets[round], index) - 1
+        counts = self.configurations[round][configuration]
+        sizes = self.suit_sizes[round][configuration]
+        index -= self.offsets[round][configuration]
+
+        suit_index = [0] * SUITS
+        for first, length in self.groups[round][configuration]:
+            group_size = choose(sizes[first] + length - 1, length)
+            part = index % group_size
+            index //= group_size
+            # largest values first
+            for k in xrange(length, 0, -1):
+                value = 0
+                low, high = 0, sizes[first]
+                while low < high:
+                    mid = (low + high) // 2
+                    if choose(mid + k - 1, k) <= part:
+                        value, low = mid, mid + 1
+                    else:
+                        high = mid
+                part -= choose(value + k - 1, k)
+                suit_index[first + length - k] = value
+
+        cards = [[] for r in xrange(round + 1)]
+        for s in xrange(SUITS):
+            used, dealt = 0, 0
+            for r in xrange(round + 1):
+                n = counts[s] >> 4 * (self.rounds - r - 1) & 0xf
+                round_size = NCR_RANKS[RANKS - dealt][n]
+                shifted = INDEX_TO_RANK_SET[n][suit_index[s] % round_size]
+                suit_index[s] //= round_size
+                dealt += n
+
+                rank_set = 0
+                while shifted:
+                    low = shifted & -shifted
+                    shifted ^= low
+                    rank = self._nth_unset(used, low.bit_length() - 1)
+                    rank_set |= 1 << rank
+                    cards[r].append(INDEX_TO_CARD[4 * rank + s])
+                used |= rank_set
+
+        return cards[0], [card for street in cards[1:] for card in street]
+
+    @staticmethod
+    def _nth_unset(used, n):
+        for rank in xrange(RANKS):
+            if not used >> rank & 1:
+                if n == 0:
+                    return rank
+                n -= 1
+        raise Exception("No unset rank {}".format(n))
+
+    def canonical(self, hand, board=()):
+        """
+        The representative of the hand and board's class: the (hand, board)
+        that unindex() returns for their id.
+        """
+        return self.unindex(self.round_of(len(hand) + len(board)), self.index(hand, board))
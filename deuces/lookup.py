@@ -1,4 +1,7 @@
 import itertools
+import mmap
+import os
+import struct
 from card import Card
 
 class LookupTable(object):
@@ -58,18 +61,66 @@ class LookupTable(object):
         9 : "High Card"
     }
 
-    def __init__(self):
+    # process wide table handed out by shared()
+    _SHARED = None
+
+    # environment variable naming the binary table file used by shared()
+    PATH_ENV_VAR = 'DEUCES_LOOKUP_TABLE'
+
+    # binary file layout, see write_table_to_disk()
+    FILE_MAGIC = 'DEUCESLT'
+    FILE_VERSION = 1
+    FILE_TABLES = ['flush_lookup', 'unsuited_lookup', 
+                   'flush_best_lookup', 'unsuited_best_lookup']
+
+    def __init__(self, generate=True):
         """
-        Calculates lookup tables
+        Calculates lookup tables, or leaves them empty when generate 
+        is False (used when reading them from disk).
         """
+        # the binary file the tables were read from, if any
+        self.filepath = None
+
         # create dictionaries
         self.flush_lookup = {}
         self.unsuited_lookup = {}
+        self.flush_best_lookup = {}
+        self.unsuited_best_lookup = {}
 
         # create the lookup table in piecewise fashion
-        self.flushes()  # this will call straights and high cards method,
-                        # we reuse some of the bit sequences
-        self.multiples()
+        if generate:
+            self.flushes()  # this will call straights and high cards method,
+                            # we reuse some of the bit sequences
+            self.multiples()
+
+    @staticmethod
+    def shared(filepath=None):
+        """
+        Returns the process wide table, creating it on first call. 
+
+        If filepath (or the DEUCES_LOOKUP_TABLE environment variable) names 
+        an existing binary table it is read instead of generated.
+        If it names a missing file, the generated table is written there so 
+        the next cold start can skip generation entirely.
+
+        Worker processes forked after the first call inherit the table
+        (copy on write); other processes read or generate their own.
+        """
+        if LookupTable._SHARED is not None:
+            return LookupTable._SHARED
+
+        filepath = filepath or os.environ.get(LookupTable.PATH_ENV_VAR)
+        if filepath and os.path.exists(filepath):
+            table = LookupTable.read_table_from_disk(filepath)
+        else:
+            table = LookupTable()
+            table.six_and_seven()
+            if filepath:
+                table.write_table_to_disk(filepath)
+                table.filepath = filepath
+
+        LookupTable._SHARED = table
+        return table
 
     def flushes(self):
         """
@@ -247,13 +298,155 @@ class LookupTable(object):
                 self.unsuited_lookup[product] = rank
                 rank += 1
 
-    def write_table_to_disk(self, table, filepath):
+    def six_and_seven(self):
         """
-        Writes lookup table to disk
+        Best 5 card rank of every 6 and 7 card hand, so that the evaluator 
+        can rank those in a single pass instead of trying all 5 card subsets.
+
+        flush_best_lookup is keyed on the rank bits of the cards in the 
+        flush suit (5 to 7 bits set). With at most 7 cards a flush rules out
+        quads and full houses, so the best flush is the best hand.
+
+        unsuited_best_lookup is keyed on the prime product of all 6 or 7 
+        cards, i.e. the rank multiplicities of the hand, and is only used
+        when there is no flush. 
+
+        Both are built bottom up: the best rank of n cards is the best rank 
+        among the hands made by dropping one of its cards.
         """
-        with open(filepath, 'w') as f:
-            for prime_prod, rank in table.iteritems():
-                f.write(str(prime_prod) +","+ str(rank) + '\n')
+        if self.flush_best_lookup and self.unsuited_best_lookup:
+            return
+
+        for ranks in itertools.combinations(Card.INT_RANKS, 5):
+            bits = 0
+            for r in ranks:
+                bits |= 1 << r
+            self.flush_best_lookup[bits] = self.flush_lookup[Card.prime_product_from_rankbits(bits)]
+
+        for n in (6, 7):
+            for ranks in itertools.combinations(Card.INT_RANKS, n):
+                bits = 0
+                for r in ranks:
+                    bits |= 1 << r
+                self.flush_best_lookup[bits] = min(
+                    self.flush_best_lookup[bits ^ (1 << r)] for r in ranks)
+
+        for n, smaller in ((6, self.unsuited_lookup), (7, self.unsuited_best_lookup)):
+            for ranks in itertools.combinations_with_replacement(Card.INT_RANKS, n):
+
+                # no more than four cards of a rank
+                if any(ranks[i] == ranks[i + 4] for i in xrange(n - 4)):
+                    continue
+
+                product = 1
+                for r in ranks:
+                    product *= Card.PRIMES[r]
+                self.unsuited_best_lookup[product] = min(
+                    smaller[product / Card.PRIMES[r]] for r in set(ranks))
+
+    def write_table_to_disk(self, filepath):
+        """
+        Writes all lookup tables to disk in a compact binary format 
+        that read_table_from_disk() and memory_map() load:
+
+            header    8 byte magic, uint32 version, uint32 number of tables
+            index     per table: 24 byte name, uint32 count, uint32 unused,
+                      uint64 keys offset, uint64 values offset
+            data      per table: count uint64 keys in ascending order, 
+                      then count uint16 ranks, padded to 8 bytes
+
+        All integers are little endian. Since keys are sorted, the arrays 
+        can also be searched in place (see memory_map()).
+
+        The file is written next to its destination and renamed, so 
+        concurrent readers never see a partial table.
+        """
+        self.six_and_seven()
+
+        header = struct.Struct('<8sII')
+        entry = struct.Struct('<24sIIQQ')
+        offset = header.size + entry.size * len(LookupTable.FILE_TABLES)
+
+        index = []
+        data = []
+        for name in LookupTable.FILE_TABLES:
+            items = sorted(getattr(self, name).iteritems())
+            keys = struct.pack('<%dQ' % len(items), *[k for k, v in items])
+            values = struct.pack('<%dH' % len(items), *[v for k, v in items])
+            values += '\0' * (-len(values) % 8)
+
+            index.append(entry.pack(name, len(items), 0, offset, offset + len(keys)))
+            data += [keys, values]
+            offset += len(keys) + len(values)
+
+        tmp_filepath = '%s.%d.tmp' % (filepath, os.getpid())
+        with open(tmp_filepath, 'wb') as f:
+            f.write(header.pack(LookupTable.FILE_MAGIC, LookupTable.FILE_VERSION, len(index)))
+            f.write(''.join(index))
+            f.write(''.join(data))
+        os.rename(tmp_filepath, filepath)
+
+    @staticmethod
+    def read_table_index(buf):
+        """
+        Parses the header of a binary table, returning a dict of 
+        name => (count, keys offset, values offset).
+        """
+        header = struct.Struct('<8sII')
+        entry = struct.Struct('<24sIIQQ')
+
+        magic, version, num_tables = header.unpack_from(buf, 0)
+        if magic != LookupTable.FILE_MAGIC or version != LookupTable.FILE_VERSION:
+            raise Exception("Invalid lookup table file")
+
+        index = {}
+        for i in xrange(num_tables):
+            name, count, _, keys_offset, values_offset = entry.unpack_from(
+                buf, header.size + i * entry.size)
+            index[name.rstrip('\0')] = (count, keys_offset, values_offset)
+        return index
+
+    @staticmethod
+    def read_table_from_disk(filepath):
+        """
+        Loads a table written by write_table_to_disk() into the usual 
+        dicts, so no table generation happens at all. The dicts belong to
+        the process; the arrays of memory_map() are shared instead.
+        """
+        with open(filepath, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        table = LookupTable(generate=False)
+        for name, (count, keys_offset, values_offset) in LookupTable.read_table_index(buf).iteritems():
+            keys = struct.unpack_from('<%dQ' % count, buf, keys_offset)
+            values = struct.unpack_from('<%dH' % count, buf, values_offset)
+            setattr(table, name, dict(itertools.izip(keys, values)))
+
+        buf.close()
+        table.filepath = filepath
+        return table
+
+    @staticmethod
+    def memory_map(filepath):
+        """
+        Maps a table written by write_table_to_disk() as read only NumPy 
+        arrays, returning a dict of name => (sorted keys, ranks). The pages
+        are shared by every process mapping the same file; BatchEvaluator 
+        searches the 6 and 7 card tables in place this way.
+
+        Requires NumPy.
+        """
+        import numpy as np
+
+        with open(filepath, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        arrays = {}
+        for name, (count, keys_offset, values_offset) in LookupTable.read_table_index(buf).iteritems():
+            keys = np.frombuffer(buf, dtype='<u8', count=count, offset=keys_offset)
+            values = np.frombuffer(buf, dtype='<u2', count=count, offset=values_offset)
+            arrays[name] = (keys, values)
+        return arrays
 
     def get_lexographically_next_bit_sequence(self, bits):
         """
@@ -0,0 +1,176 @@
+'''
+Expected value of player1 against player2, computed instead of simulated.
+
+    evaluator = ExactEvaluator(player1, player2)
+    evaluator.dealValue(hand1, hand2, flop)     # exact, given these cards
+    evaluator.evaluate(numDeals=1000)           # {'mean', 'stderr', ...}
+
+Given both hands and the flop, dealValue() walks every betting path and
+every turn and river card, weighting each path by the probability that the
+players take it, so the value has no sampling noise at all. evaluate()
+averages it over sampled (hands, flop) deals: what is left of the variance
+of simulate() is only that of the deal, most of it is gone with the
+betting and the last two cards.
+
+The players' action probabilities come from their actionProbabilities(game)
+when they have one (RandomPlayer, QLearningAlgorithm, cfr.CFRPlayer), and
+otherwise from a single getAction() call: players without the method must
+be deterministic. OraclePlayer, which sees the turn and the river, is
+walked with these cards known from the start of the game.
+
+Subtree values are cached in a transposition table keyed by the compact
+state of the game, so betting paths that lead to the same bets (bet and
+call, check, raise and call) are only walked once per card.
+'''
+import copy
+import random
+import timeit
+
+import numpy as np
+
+from deuces import Deck
+from deuces.batch import BatchEvaluator
+from deuces.flatlookup import FlatLookupTable
+from leduc import OraclePlayer, OracleContext, Poker
+
+NUM_ROUNDS = 5
+
+# Probability of each action |player| may take in |game|.
+def actionProbabilities(player, game):
+    probabilities = getattr(player, 'actionProbabilities', None)
+    if probabilities is not None:
+        return probabilities(game)
+    return {player.getAction(game): 1.0}
+
+# What the players can see of Poker.state, as a transposition table key.
+def stateKey(state):
+    return (state['currentPlayer'], tuple(state['communityCards']),
+            sum(state['player1Bets']), sum(state['player2Bets']),
+            state['player1Fold'], state['player2Fold'], tuple(state['player1legalActions']))
+
+# Copy of Poker.state for backtracking; the deck is shared, the walk never
+# draws from it.
+def snapshot(state):
+    return dict((k, list(v) if isinstance(v, list) else v) for k, v in state.items())
+
+class ExactEvaluator:
+    '''
+    Expected utility of |player1| against |player2| on given cards.
+      clairvoyant: whether the turn and river are known from the start,
+        by default when either player is an OraclePlayer
+      hits, misses: transposition table statistics
+    '''
+    def __init__(self, player1, player2, clairvoyant=None):
+        # getAction() may count its calls, as QLearningAlgorithm does
+        self.players = {'Player1': copy.copy(player1), 'Player2': copy.copy(player2)}
+        if clairvoyant is None:
+            clairvoyant = isinstance(player1, OraclePlayer) or isinstance(player2, OraclePlayer)
+        self.clairvoyant = clairvoyant
+        self.batch = BatchEvaluator(FlatLookupTable.shared())
+        self.hits = 0
+        self.misses = 0
+
+    # player1's exact expected utility once |hand1|, |hand2| and |flop| (card
+    # ints) are dealt.
+    def dealValue(self, hand1, hand2, flop):
+        dead = set(hand1) | set(hand2) | set(flop)
+        cards = [c for c in Deck.GetFullDeck() if c not in dead]
+        n = len(cards)
+
+        # showdown of every (turn, river): wins[t, r] if player1 wins
+        turns, rivers = np.nonzero(~np.eye(n, dtype=bool))
+        boards = np.column_stack((np.tile(flop, (len(turns), 1)), np.array(cards)[turns], np.array(cards)[rivers]))
+        rank1 = self.batch.evaluate(np.tile(hand1, (len(turns), 1)), boards)
+        rank2 = self.batch.evaluate(np.tile(hand2, (len(turns), 1)), boards)
+        wins = np.zeros((n, n))
+        wins[turns, rivers] = rank1 > rank2
+        self.cards = cards
+        self.wins = wins
+        self.winRates = wins.sum(axis=1) / (n - 1)
+
+        # dealing a Poker game and the players' getAction() may use the
+        # random module, keep it untouched
+        randomState = random.getstate()
+        try:
+            game = Poker(num_rounds=NUM_ROUNDS)
+            state = game.state
+            state['player1Hand'] = list(hand1)
+            state['player2Hand'] = list(hand2)
+            state['communityCards'] = list(flop)
+            self.table = {}
+
+            if not self.clairvoyant:
+                return self.walk(game, None)
+            value = 0.0
+            for t, r in zip(turns, rivers):
+                game.future_cards_for_oracle = [cards[t], cards[r]]
+                game.oracleContext = OracleContext(game)
+                self.table = {}
+                value += self.walk(game, (t, r))
+            return value / len(turns)
+        finally:
+            random.setstate(randomState)
+            del self.table
+
+    # player1's expected utility from the state of |game|, |future| being
+    # the indices of the turn and river in self.cards when they are known.
+    def walk(self, game, future):
+        state = game.state
+        if state['player1Fold']:
+            return -sum(state['player1Bets'])
+        if state['player2Fold']:
+            return sum(state['player2Bets'])
+
+        key = stateKey(state)
+        value = self.table.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        player = state['currentPlayer']
+        saved = snapshot(state)
+        if player == 'Dealer':
+            if len(state['communityCards']) == NUM_ROUNDS - 1:
+                # the river ends the game
+                turn = self.cards.index(state['communityCards'][-1])
+                winRate = self.wins[turn, future[1]] if future else self.winRates[turn]
+                value = winRate * sum(state['player2Bets']) - (1 - winRate) * sum(state['player1Bets'])
+            else:
+                turns = [future[0]] if future else range(len(self.cards))
+                value = 0.0
+                for t in turns:
+                    game.state = snapshot(saved)
+                    game.state['communityCards'].append(self.cards[t])
+                    game.refreshState()
+                    value += self.walk(game, future)
+                value /= len(turns)
+        else:
+            value = 0.0
+            for action, p in actionProbabilities(self.players[player], game).items():
+                if p > 0:
+                    game.state = snapshot(saved)
+                    game.successor(game.state, action)
+                    value += p * self.walk(game, future)
+
+        game.state = saved
+        self.table[key] = value
+        return value
+
+    # Average of dealValue() over |numDeals| (hands, flop) deals drawn from
+    # a deck seeded with |seed|. Returns {'mean', 'stderr', 'deals',
+    # 'seconds'}.
+    def evaluate(self, numDeals=1000, seed=0):
+        start = timeit.default_timer()
+        deck = Deck(random.Random(seed))
+        values = []
+        for i in range(numDeals):
+            deck.shuffle()
+            values.append(self.dealValue(deck.draw(2), deck.draw(2), deck.draw(3)))
+        values = np.array(values)
+        return {
+            'mean': values.mean(),
+            'stderr': values.std() / np.sqrt(max(len(values), 1)),
+            'deals': len(values),
+            'seconds': timeit.default_timer() - start,
+        }
@@ -0,0 +1,206 @@
+'''
+Exploitability of a trained agent: how much a best responding opponent wins
+against it per game.
+
+    result = exploitability(player1)
+    print(result['exploitability'], result['stderr'])
+
+The agent is anything with getAction(game), such as a QLearningAlgorithm
+with explorationProb 0. Each seat of the game can guarantee 0 (check and
+fold), so the game is worth 0 and the best response value is the
+exploitability.
+
+The best response is computed on sampled chance outcomes, organised so that
+the agent is queried as little as possible:
+  - a group is a deal of the agent's hand and the 5 community cards; the
+    agent's action probabilities only depend on the group and the betting,
+    so they are queried once per group and public state (memoized)
+  - each group is shared by |opponentHands| hands of the best responder,
+    which all reuse these probabilities
+The best responder knows its hand strength bucket in each round (a quantile
+of its rank on the board, as in cfr.BucketModel) and the betting history.
+Its actions are chosen on one sample by walking the betting tree of
+cfr.buildTree() bottom-up, all deals at once in NumPy, then valued on a
+second, independent sample. A best response restricted to buckets is a
+lower bound of the real one.
+'''
+import copy
+import random
+import timeit
+
+import numpy as np
+
+from cfr import FIRST_BOARD, NUM_ROUNDS, buildTree
+from deuces.batch import BatchEvaluator
+from deuces.flatlookup import FlatLookupTable
+from leduc import PLAYER1, PLAYER2, PLAYERS, Poker
+
+# Samples |groups| groups of |opponentHands| deals each. Returns card
+# indices: the agent's hands (G, 2), the boards (G, 5) and the opponent's
+# hands (G * M, 2), group g owning deals g * M to (g + 1) * M - 1.
+def sampleDeals(rng, groups, opponentHands):
+    if 7 + 2 * opponentHands > 52:
+        raise Exception("At most 22 opponent hands per group")
+    cards = rng.rand(groups, 52).argsort(axis=1)
+    agentHands = cards[:, :2]
+    boards = cards[:, 2:7]
+    opponents = cards[:, 7:7 + 2 * opponentHands].reshape(-1, 2)
+    return agentHands, boards, opponents
+
+class BestResponse:
+    '''
+    A best response to |agent| sitting in |seat| (PLAYER1 or PLAYER2).
+      numBuckets: hand strength buckets per round of the best responder
+      samples: getAction() calls per query, the action probabilities are
+        their frequencies; 1 is exact for deterministic agents
+      boundaries: rank quantiles splitting each round into buckets
+      choices: {node: action index per bucket state} of the best responder
+      queries: getAction() calls made so far
+    '''
+    def __init__(self, agent, seat=PLAYER1, numBuckets=16, samples=1):
+        # getAction() may count its calls, as QLearningAlgorithm does
+        self.agent = copy.copy(agent)
+        self.seat = seat
+        self.numBuckets = numBuckets
+        self.samples = samples
+        self.tree = buildTree()
+        self.batch = BatchEvaluator(FlatLookupTable.shared())
+        self.boundaries = None
+        self.choices = {}
+        self.queries = 0
+
+    # Chooses the best responder's actions on |groups| * |opponentHands|
+    # sampled deals. Returns the value of the best response on them, which
+    # is biased up by the choices being fitted to the same sample.
+    def fit(self, rng, groups=1024, opponentHands=16):
+        return self.value(rng, groups, opponentHands, fit=True)
+
+    # Value of the best response per game, averaged over |groups| groups of
+    # |opponentHands| deals, and its standard error.
+    def evaluate(self, rng, groups=1024, opponentHands=16):
+        return self.value(rng, groups, opponentHands, fit=False)
+
+    def value(self, rng, groups, opponentHands, fit):
+        agentHands, boards, opponents = sampleDeals(rng, groups, opponentHands)
+        groupBoards = np.repeat(boards, opponentHands, axis=0)
+
+        ranks = [self.batch.evaluate(opponents, groupBoards[:, :FIRST_BOARD + r]).astype(np.int64)
+                 for r in range(NUM_ROUNDS - FIRST_BOARD + 1)]
+        agentRanks = self.batch.evaluate(np.repeat(agentHands, opponentHands, axis=0), groupBoards)
+        if self.seat == PLAYER1:
+            self.won = agentRanks > ranks[-1]
+        else:
+            self.won = ranks[-1] > agentRanks
+
+        if fit:
+            quantiles = np.linspace(0, 100, self.numBuckets + 1)[1:-1]
+            self.boundaries = [np.percentile(ranks[r], quantiles) for r in (0, 1)]
+        buckets = [np.searchsorted(self.boundaries[r], ranks[r], side='right') for r in (0, 1)]
+        self.states = {1: buckets[0], 2: buckets[0] * self.numBuckets + buckets[1]}
+
+        self.deals = (agentHands, boards, opponents[::opponentHands])
+        self.opponentHands = opponentHands
+        self.fitting = fit
+        self.memo = {}
+
+        # the agent queries made here use the random module, keep it untouched
+        randomState = random.getstate()
+        try:
+            values = self.walk(self.tree, np.ones(groups), ())
+        finally:
+            random.setstate(randomState)
+        del self.won, self.states, self.deals, self.memo
+
+        groupValues = values.reshape(groups, opponentHands).mean(axis=1)
+        return groupValues.mean(), groupValues.std() / np.sqrt(groups)
+
+    # Values of |node| for the best responder on every deal, the agent
+    # reaching it with probability |reach| in each group. |path| holds the
+    # actions that led to the node.
+    def walk(self, node, reach, path):
+        M = self.opponentHands
+        if node.kind == 'terminal':
+            if node.fold == PLAYER1:
+                values = np.full(len(reach) * M, -node.player1Bet, dtype=float)
+            elif node.fold == PLAYER2:
+                values = np.full(len(reach) * M, float(node.player2Bet))
+            else:
+                # self.won is whether player1 wins, whichever seat the agent has
+                values = np.where(self.won, node.player2Bet, -node.player1Bet).astype(float)
+            return -values if self.seat == PLAYER1 else values
+        if node.kind == 'chance':
+            return self.walk(node.children[0], reach, path + ('draw_card',))
+        if not reach.any():
+            return np.zeros(len(reach) * M)
+
+        if node.player == self.seat:
+            sigma = self.actionProbabilities(node, reach, path)
+            values = np.zeros(len(reach) * M)
+            for a, child in enumerate(node.children):
+                childValues = self.walk(child, reach * sigma[:, a], path + (node.actions[a],))
+                values += np.repeat(sigma[:, a], M) * childValues
+            return values
+
+        actionValues = np.array([self.walk(child, reach, path + (action,))
+                                 for action, child in zip(node.actions, node.children)])
+        states = self.states[node.round]
+        if self.fitting:
+            size = self.numBuckets ** node.round
+            weights = np.repeat(reach, M)
+            totals = np.array([np.bincount(states, weights * v, minlength=size) for v in actionValues])
+            self.choices[node] = totals.argmax(axis=0)
+        # nodes the agent never reached while fitting: first action
+        best = self.choices[node][states] if node in self.choices else np.zeros(len(states), dtype=int)
+        return actionValues[best, np.arange(len(best))]
+
+    # Action probabilities (G, actions) of the agent at |node| in each group
+    # it reaches, queried once per group and history.
+    def actionProbabilities(self, node, reach, path):
+        sigma = np.zeros((len(reach), len(node.actions)))
+        for g in np.flatnonzero(reach):
+            key = (g, path)
+            if key not in self.memo:
+                game = self.replay(g, path)
+                counts = np.zeros(len(node.actions))
+                for i in range(self.samples):
+                    counts[node.actions.index(self.agent.getAction(game))] += 1
+                self.queries += self.samples
+                self.memo[key] = counts / self.samples
+            sigma[g] = self.memo[key]
+        return sigma
+
+    # A live Poker game of group |g| after the actions of |path|, as the
+    # agent would see it. The opponent holds the group's first hand.
+    def replay(self, g, path):
+        agentHands, boards, opponents = self.deals
+        hand = [int(c) for c in BatchEvaluator.INDEX_TO_CARD[agentHands[g]]]
+        opponent = [int(c) for c in BatchEvaluator.INDEX_TO_CARD[opponents[g]]]
+        board = [int(c) for c in BatchEvaluator.INDEX_TO_CARD[boards[g]]]
+
+        game = Poker(num_rounds=NUM_ROUNDS)
+        state = game.state
+        state['player1Hand'], state['player2Hand'] = (hand, opponent) if self.seat == PLAYER1 else (opponent, hand)
+        state['communityCards'] = board[:FIRST_BOARD]
+        state['deck'].shuffle()
+        state['deck'].putBack(board[:FIRST_BOARD - 1:-1])
+        for action in path:
+            game.successor(state, action)
+        assert game.player() == PLAYERS[self.seat]
+        return game
+
+# The exploitability of |agent| playing in |seat|: the value per game of a
+# best response fitted on one sample and valued on another. Returns
+# {'exploitability', 'stderr', 'fitted', 'queries', 'seconds'}.
+def exploitability(agent, seat=PLAYER1, groups=1024, opponentHands=16, numBuckets=16, samples=1, seed=0):
+    start = timeit.default_timer()
+    rng = np.random.RandomState(seed)
+    response = BestResponse(agent, seat, numBuckets, samples)
+    fitted, _ = response.fit(rng, groups, opponentHands)
+    value, stderr = response.evaluate(rng, groups, opponentHands)
+    return {
+        'exploitability': value,
+        'stderr': stderr,
+        'fitted': fitted,
+        'queries': response.queries,
+        'seconds': timeit.default_timer() - start,
+    }
@@ -1,10 +1,23 @@
+import ast
 import copy
+import cProfile
 from collections import defaultdict
+from collections import deque
 from deuces import Card
 from deuces import Deck
 from deuces import Evaluator
+from deuces.equity import EquityTable
+from deuces.equity import MonteCarloEquity
 import math
+import multiprocessing
+import numpy as np
+import os
+import pstats
 import random
+import struct
+import threading
+import timeit
+import zlib
 
 ########################
 # Poker Game Simulator #
@@ -12,6 +25,84 @@ import random
 
 evaluator = Evaluator()
 
+class HandStrengthCache:
+    '''
+    Memoizes evaluator.evaluate() so that each distinct (hand, board) is
+    evaluated once, however many feature extractors, agents and utility
+    computations ask for it. The rank only depends on the set of cards, so
+    the key is the frozenset of hand + board card ints (half the cost of a
+    sorted tuple). Once maxSize keys are stored the oldest key is evicted.
+    '''
+    def __init__(self, evaluator, maxSize=1 << 16):
+        self.evaluator = evaluator
+        self.maxSize = maxSize
+        self.ranks = {}
+        self.keys = deque()
+        self.hits = 0
+        self.misses = 0
+        self.monteCarlo = None
+        self.sampledEquities = {}
+
+    def rank(self, hand, board):
+        key = frozenset(hand + board)
+        rank = self.ranks.get(key)
+        if rank is not None:
+            self.hits += 1
+            return rank
+
+        self.misses += 1
+        rank = self.evaluator.evaluate(hand, board)
+        self.ranks[key] = rank
+        self.keys.append(key)
+        if len(self.keys) > self.maxSize:
+            del self.ranks[self.keys.popleft()]
+        return rank
+
+    # Equity against a random hand with the board run out, looked up in
+    # EquityTable.shared(): by flop class on the flop when the table has
+    # them, so draws count, otherwise by the cached rank.
+    def equity(self, hand, board):
+        table = EquityTable.shared()
+        if not board or len(board) == 3 and table.flop_class:
+            return table.equity(hand, board)
+        return table.rank_equity(self.rank(hand, board), len(board))
+
+    # Monte Carlo estimate of the equity for this very hand and board, or
+    # against |opponentRange|, a list of hands (see MonteCarloEquity). Only
+    # estimates against a random hand are memoized.
+    def sampledEquity(self, hand, board, opponentRange=None, tolerance=0.02):
+        if self.monteCarlo is None:
+            self.monteCarlo = MonteCarloEquity(batch_size=512)
+        if opponentRange is not None:
+            return self.monteCarlo.equity(hand, board, opponentRange, tolerance=tolerance)
+
+        key = (frozenset(hand), frozenset(board), tolerance)
+        equity = self.sampledEquities.get(key)
+        if equity is None:
+            if len(self.sampledEquities) >= self.maxSize:
+                self.sampledEquities.clear()
+            equity = self.monteCarlo.equity(hand, board, tolerance=tolerance)
+            self.sampledEquities[key] = equity
+        return equity
+
+    def clear(self):
+        self.ranks.clear()
+        self.keys.clear()
+        self.sampledEquities.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.ranks),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits * 1.0 / lookups if lookups else 0.0,
+        }
+
+handStrength = HandStrengthCache(evaluator)
+
 def legalActions(state):
     def maxBet(state):
         return min(state['player1Stack'], state['player2Stack'])
@@ -58,8 +149,9 @@ class Poker:
         self.num_rounds = num_rounds
         self.player1StackStart = player1Stack
         self.player2StackStart = player2Stack
-        self.evaluator = Evaluator()
+        self.evaluator = evaluator
         self.future_cards_for_oracle = []
+        self.oracleContext = None
         self.state = {}
         self.state['deck'] = Deck()
         self.state['currentPlayer'] = 'Player1'
@@ -181,8 +273,8 @@ class Poker:
         if self.state['player2Fold']:
             return self.state['player1Stack'] + pot(self.state) - self.player1StackStart
 
-        player1HandVal = self.evaluator.evaluate(self.state['player1Hand'], self.state['communityCards'])
-        player2HandVal = self.evaluator.evaluate(self.state['player2Hand'], self.state['communityCards'])
+        player1HandVal = handStrength.rank(self.state['player1Hand'], self.state['communityCards'])
+        player2HandVal = handStrength.rank(self.state['player2Hand'], self.state['communityCards'])
         if player1HandVal > player2HandVal:
             return self.state['player1Stack'] + pot(self.state) - self.player1StackStart
         else:
@@ -200,64 +292,677 @@ class Poker:
     def getState(self):
         return copy.deepcopy(self.state)
 
+    def compactState(self):
+        return PokerState.fromGame(self)
+
+########################
+# Compact Search State #
+########################
+
+# Integer encoding of actions and players used by PokerState.
+ACTIONS = ['check', 'bet', 'call', 'fold', 'raise', 'draw_card']
+ACTION_IDS = dict((a, i) for i, a in enumerate(ACTIONS))
+PLAYERS = ['Player1', 'Player2', 'Dealer']
+PLAYER1, PLAYER2, DEALER = range(3)
+
+class PokerState(object):
+    '''
+    Compact copy of Poker.state for lookahead and tree search. apply() plays
+    an action in place with the same rules as Poker.successor, and undo()
+    restores the state exactly as it was before the last apply().
+
+    Fields:
+      numRounds (int): number of community cards that ends the game
+      player1StackStart (int): player1's stack at the start of the game
+      currentPlayer (int): PLAYER1, PLAYER2 or DEALER
+      player1Hand (tuple): card ints
+      player2Hand (tuple): card ints
+      communityCards (list): card ints
+      player1Bet (int): sum of player1Bets
+      player2Bet (int): sum of player2Bets
+      player1Stack (int): player1's stack
+      player2Stack (int): player2's stack
+      player1Fold (bool): if player1 folds
+      player2Fold (bool): if player2 folds
+      roundFirstAction (int): id of player1's first action this round, or -1
+      roundSecondAction (int): id of player1's second action this round, or -1
+      history (list): action ids of every action applied, draws included
+    '''
+    __slots__ = ('numRounds', 'player1StackStart', 'currentPlayer',
+                 'player1Hand', 'player2Hand', 'communityCards',
+                 'player1Bet', 'player2Bet', 'player1Stack', 'player2Stack',
+                 'player1Fold', 'player2Fold', 'roundFirstAction', 'roundSecondAction',
+                 'history', 'undoStack')
+
+    def __init__(self, player1Hand, player2Hand, communityCards, num_rounds=2,
+                 player1Stack=100, player2Stack=100):
+        self.numRounds = num_rounds
+        self.player1StackStart = player1Stack
+        self.currentPlayer = PLAYER1
+        self.player1Hand = tuple(player1Hand)
+        self.player2Hand = tuple(player2Hand)
+        self.communityCards = list(communityCards)
+        self.player1Bet = 0
+        self.player2Bet = 0
+        self.player1Stack = player1Stack
+        self.player2Stack = player2Stack
+        self.player1Fold = False
+        self.player2Fold = False
+        self.roundFirstAction = -1
+        self.roundSecondAction = -1
+        self.history = []
+        self.undoStack = []
+
+    @staticmethod
+    def fromGame(game):
+        '''
+            return the compact state of a Poker game (the deck is not kept).
+        '''
+        state = game.state
+        compact = PokerState(state['player1Hand'], state['player2Hand'], state['communityCards'],
+                             num_rounds=game.num_rounds, player1Stack=game.player1StackStart,
+                             player2Stack=game.player2StackStart)
+        compact.currentPlayer = PLAYERS.index(state['currentPlayer'])
+        compact.player1Bet = sum(state['player1Bets'])
+        compact.player2Bet = sum(state['player2Bets'])
+        compact.player1Stack = state['player1Stack']
+        compact.player2Stack = state['player2Stack']
+        compact.player1Fold = state['player1Fold']
+        compact.player2Fold = state['player2Fold']
+        roundActions = [ACTION_IDS[a] for a in state['player1legalActions']] + [-1, -1]
+        compact.roundFirstAction, compact.roundSecondAction = roundActions[:2]
+        return compact
+
+    def apply(self, action, cards=()):
+        '''
+            play |action| in place, |cards| are the cards dealt by a draw_card.
+        '''
+        action_id = ACTION_IDS[action]
+        self.undoStack.append((self.currentPlayer, self.player1Bet, self.player2Bet,
+                               self.player1Stack, self.player2Stack, self.player1Fold,
+                               self.player2Fold, self.roundFirstAction, self.roundSecondAction,
+                               len(self.communityCards)))
+        self.history.append(action_id)
+
+        if self.currentPlayer == PLAYER1:
+            # Player1's first action in a round
+            if self.roundFirstAction == -1:
+                if action == 'bet':
+                    self.player1Bet += 1
+                    self.player1Stack -= 1
+                elif action == 'fold':
+                    self.player1Fold = True
+                elif action != 'check':
+                    self.undo()
+                    raise Exception("Invalid action: {}".format(action))
+                self.roundFirstAction = action_id
+                self.currentPlayer = PLAYER2
+            else:
+                if action == 'call':
+                    self.player1Bet += 1
+                    self.player1Stack -= 1
+                elif action == 'fold':
+                    self.player1Fold = True
+                else:
+                    self.undo()
+                    raise Exception("Invalid action: {}".format(action))
+                self.roundSecondAction = action_id
+                self.currentPlayer = DEALER
+        elif self.currentPlayer == PLAYER2:
+            # if player2 not raise, next player will be Dealer.
+            self.currentPlayer = DEALER
+            if action == 'fold':
+                self.player2Fold = True
+            elif action == 'call':
+                self.player2Bet += 1
+                self.player2Stack -= 1
+            elif action == 'raise':
+                raise_amount = 1
+                if self.roundFirstAction == ACTION_IDS['bet']:
+                    raise_amount = 2
+                self.player2Bet += raise_amount
+                self.player2Stack -= raise_amount
+                self.currentPlayer = PLAYER1
+            elif action != 'check':
+                self.undo()
+                raise Exception("Invalid action: {}".format(action))
+        else:
+            if action != 'draw_card' or len(cards) != (3 if len(self.communityCards) == 0 else 1):
+                self.undo()
+                raise Exception("Invalid draw: {} {}".format(action, cards))
+            self.communityCards.extend(cards)
+            self.currentPlayer = PLAYER1
+            self.roundFirstAction = -1
+            self.roundSecondAction = -1
+
+    def undo(self):
+        '''
+            revert the last apply().
+        '''
+        (self.currentPlayer, self.player1Bet, self.player2Bet,
+         self.player1Stack, self.player2Stack, self.player1Fold,
+         self.player2Fold, self.roundFirstAction, self.roundSecondAction,
+         num_community) = self.undoStack.pop()
+        del self.communityCards[num_community:]
+        self.history.pop()
+
+    def legalActions(self):
+        if self.currentPlayer == DEALER:
+            return ['draw_card']
+
+        maxBet = min(self.player1Stack, self.player2Stack)
+        if self.currentPlayer == PLAYER1:
+            if self.player1Bet == self.player2Bet:
+                if maxBet > 0:
+                    return ['check', 'bet']
+                else:
+                    return ['check']
+            else:
+                return ['fold', 'call']
+
+        if self.player1Bet > self.player2Bet:
+            return ['fold', 'call', 'raise']
+        else:
+            if maxBet > 0:
+                return ['check', 'raise']
+            else:
+                return ['check']
+
+    def isEnd(self):
+        return len(self.communityCards) == self.numRounds or self.player1Fold or self.player2Fold
+
+    def pot(self):
+        return self.player1Bet + self.player2Bet
+
+    def utility(self):
+        '''
+            player1's utility, same as Poker.utility().
+        '''
+        if not self.isEnd():
+            return 0
+        if self.player1Fold:
+            return self.player1Stack - self.player1StackStart
+        if self.player2Fold:
+            return self.player1Stack + self.pot() - self.player1StackStart
+
+        player1HandVal = handStrength.rank(list(self.player1Hand), self.communityCards)
+        player2HandVal = handStrength.rank(list(self.player2Hand), self.communityCards)
+        if player1HandVal > player2HandVal:
+            return self.player1Stack + self.pot() - self.player1StackStart
+        else:
+            return self.player1Stack - self.player1StackStart
+
+    def key(self):
+        '''
+            hashable summary of the state (cards, bets, stacks and history).
+        '''
+        return (self.player1Hand, self.player2Hand, tuple(self.communityCards),
+                self.currentPlayer, self.player1Bet, self.player2Bet,
+                self.player1Stack, self.player2Stack, self.player1Fold,
+                self.player2Fold, self.roundFirstAction, self.roundSecondAction)
+
+    def toDict(self):
+        '''
+            return a dict shaped like Poker.state (without the deck), e.g. for
+            feature extractors. Bets are reported as a single running total.
+        '''
+        return {
+            'currentPlayer': PLAYERS[self.currentPlayer],
+            'player1Hand': list(self.player1Hand),
+            'player2Hand': list(self.player2Hand),
+            'player1legalActions': [ACTIONS[a] for a in (self.roundFirstAction, self.roundSecondAction) if a >= 0],
+            'communityCards': list(self.communityCards),
+            'player1Bets': [self.player1Bet] if self.player1Bet else [],
+            'player2Bets': [self.player2Bet] if self.player2Bet else [],
+            'player1Stack': self.player1Stack,
+            'player2Stack': self.player2Stack,
+            'player1Fold': self.player1Fold,
+            'player2Fold': self.player2Fold,
+        }
+
+########################
+# Vectorized Simulator #
+########################
+
+class VectorPoker(object):
+    '''
+    N independent games of Poker played in lockstep with NumPy arrays. Every
+    field of PokerState becomes an array with one entry per game, step()
+    applies one action per game with the rules of Poker.successor, and
+    utility() scores the finished games like Poker.utility().
+
+    Arrays (length N unless noted):
+      player1Hand (N, hand_size): card ints
+      player2Hand (N, hand_size): card ints
+      communityCards (N, max(num_rounds, 3)): every card the dealer will
+          deal, only the first numCommunity of each row are on the table
+      numCommunity: number of community cards dealt
+      player1Bet, player2Bet: running bet totals
+      player1Stack, player2Stack: stacks
+      player1Fold, player2Fold (bool): folds
+      currentPlayer: PLAYER1, PLAYER2 or DEALER
+      roundFirstAction, roundSecondAction: player1's action ids this round, or -1
+    '''
+
+    def __init__(self, n, num_rounds=2, hand_size=2, player1Stack=100, player2Stack=100, rng=None):
+        from deuces.batch import BatchEvaluator
+
+        self.n = n
+        self.num_rounds = num_rounds
+        self.player1StackStart = player1Stack
+        self.rng = rng or np.random
+
+        # deal every card up front: sorting random keys gives each game an
+        # independent random permutation of the deck
+        num_cards = 2 * hand_size + max(num_rounds, 3)
+        deal = np.argsort(self.rng.rand(n, 52), axis=1)[:, :num_cards]
+        cards = BatchEvaluator.INDEX_TO_CARD[deal]
+
+        self.player1Hand = cards[:, :hand_size]
+        self.player2Hand = cards[:, hand_size:2 * hand_size]
+        self.communityCards = cards[:, 2 * hand_size:]
+        self.numCommunity = np.full(n, 3, dtype=np.int64)
+        self.player1Bet = np.zeros(n, dtype=np.int64)
+        self.player2Bet = np.zeros(n, dtype=np.int64)
+        self.player1Stack = np.full(n, player1Stack, dtype=np.int64)
+        self.player2Stack = np.full(n, player2Stack, dtype=np.int64)
+        self.player1Fold = np.zeros(n, dtype=bool)
+        self.player2Fold = np.zeros(n, dtype=bool)
+        self.currentPlayer = np.full(n, PLAYER1, dtype=np.int64)
+        self.roundFirstAction = np.full(n, -1, dtype=np.int64)
+        self.roundSecondAction = np.full(n, -1, dtype=np.int64)
+
+    def isEnd(self):
+        return (self.numCommunity == self.num_rounds) | self.player1Fold | self.player2Fold
+
+    def legalActionMask(self):
+        '''
+            return an (N, len(ACTIONS)) bool array of the actions legalActions()
+            allows in each game. Finished games have no legal action.
+        '''
+        mask = np.zeros((self.n, len(ACTIONS)), dtype=bool)
+        live = ~self.isEnd()
+        canBet = np.minimum(self.player1Stack, self.player2Stack) > 0
+        even = self.player1Bet == self.player2Bet
+
+        p1 = live & (self.currentPlayer == PLAYER1)
+        mask[p1 & even, ACTION_IDS['check']] = True
+        mask[p1 & even & canBet, ACTION_IDS['bet']] = True
+        mask[p1 & ~even, ACTION_IDS['fold']] = True
+        mask[p1 & ~even, ACTION_IDS['call']] = True
+
+        p2 = live & (self.currentPlayer == PLAYER2)
+        behind = self.player1Bet > self.player2Bet
+        mask[p2 & behind, ACTION_IDS['fold']] = True
+        mask[p2 & behind, ACTION_IDS['call']] = True
+        mask[p2 & behind, ACTION_IDS['raise']] = True
+        mask[p2 & ~behind, ACTION_IDS['check']] = True
+        mask[p2 & ~behind & canBet, ACTION_IDS['raise']] = True
+
+        mask[live & (self.currentPlayer == DEALER), ACTION_IDS['draw_card']] = True
+        return mask
+
+    def sampleLegalActions(self, mask=None):
+        '''
+            return one uniformly random legal action id per game (-1 for
+            finished games), i.e. a batched RandomPlayer.
+        '''
+        if mask is None:
+            mask = self.legalActionMask()
+        scores = self.rng.rand(self.n, len(ACTIONS)) * mask
+        return np.where(mask.any(axis=1), scores.argmax(axis=1), -1)
+
+    def step(self, actions):
+        '''
+            apply one action id per game, same rules as Poker.successor.
+            Entries for finished games are ignored.
+        '''
+        a = np.asarray(actions)
+        live = ~self.isEnd()
+        bet, call, fold = a == ACTION_IDS['bet'], a == ACTION_IDS['call'], a == ACTION_IDS['fold']
+        check, rais = a == ACTION_IDS['check'], a == ACTION_IDS['raise']
+
+        p1 = live & (self.currentPlayer == PLAYER1)
+        first = p1 & (self.roundFirstAction == -1)
+        second = p1 & ~first
+        p2 = live & (self.currentPlayer == PLAYER2)
+        dealer = live & (self.currentPlayer == DEALER)
+
+        invalid = (first & ~(check | bet | fold)) | (second & ~(call | fold)) \
+                  | (p2 & ~(check | fold | call | rais)) | (dealer & (a != ACTION_IDS['draw_card']))
+        if invalid.any():
+            raise Exception("Invalid action in games {}".format(np.flatnonzero(invalid)))
+
+        # Player1
+        p1Pays = (first & bet) | (second & call)
+        self.player1Bet += p1Pays
+        self.player1Stack -= p1Pays
+        self.player1Fold |= p1 & fold
+        self.roundFirstAction[first] = a[first]
+        self.roundSecondAction[second] = a[second]
+        self.currentPlayer[first] = PLAYER2
+        self.currentPlayer[second] = DEALER
+
+        # Player2, raising 2 over a bet and 1 over a check
+        raiseAmount = np.where(self.roundFirstAction == ACTION_IDS['bet'], 2, 1)
+        p2Pays = np.where(p2 & call, 1, 0) + np.where(p2 & rais, raiseAmount, 0)
+        self.player2Bet += p2Pays
+        self.player2Stack -= p2Pays
+        self.player2Fold |= p2 & fold
+        self.currentPlayer[p2] = np.where(rais[p2], PLAYER1, DEALER)
+
+        # Dealer
+        self.numCommunity += np.where(dealer, np.where(self.numCommunity == 0, 3, 1), 0)
+        self.currentPlayer[dealer] = PLAYER1
+        self.roundFirstAction[dealer] = -1
+        self.roundSecondAction[dealer] = -1
+
+    def utility(self):
+        '''
+            return player1's utility in every game, same as Poker.utility():
+            0 for unfinished games.
+        '''
+        end = self.isEnd()
+        pot = self.player1Bet + self.player2Bet
+        win = self.player1Stack + pot - self.player1StackStart
+        lose = self.player1Stack - self.player1StackStart
+
+        showdown = np.flatnonzero(end & ~self.player1Fold & ~self.player2Fold)
+        player1Wins = self.player2Fold.copy()
+        if len(showdown):
+            board = self.communityCards[showdown, :self.num_rounds]
+            player1HandVal = evaluator.evaluate_batch(self.player1Hand[showdown], board)
+            player2HandVal = evaluator.evaluate_batch(self.player2Hand[showdown], board)
+            player1Wins[showdown] = player1HandVal > player2HandVal
+
+        return np.where(end, np.where(player1Wins, win, lose), 0)
+
+    def state(self, i):
+        '''
+            return game |i| as a PokerState.
+        '''
+        state = PokerState(self.player1Hand[i].tolist(), self.player2Hand[i].tolist(),
+                           self.communityCards[i, :self.numCommunity[i]].tolist(),
+                           num_rounds=self.num_rounds, player1Stack=self.player1StackStart)
+        state.currentPlayer = int(self.currentPlayer[i])
+        state.player1Bet = int(self.player1Bet[i])
+        state.player2Bet = int(self.player2Bet[i])
+        state.player1Stack = int(self.player1Stack[i])
+        state.player2Stack = int(self.player2Stack[i])
+        state.player1Fold = bool(self.player1Fold[i])
+        state.player2Fold = bool(self.player2Fold[i])
+        state.roundFirstAction = int(self.roundFirstAction[i])
+        state.roundSecondAction = int(self.roundSecondAction[i])
+        return state
+
 ################
 # RL Simulator #
 # Assume only player1 can be a RL player, 
 # player1 and player2 can both be random, baseline, random players.
 ################
 
-def simulate(player1, player2, numTrials=1000, verbose=False, sort=False):
-    # Return i in [0, ..., len(probs)-1] with probability probs[i].
-    num_rounds = 5
-    hand_size = 2
-
-    totalRewards = []  # The rewards we get on each trial
-    for trial in range(numTrials):
-        leducGame = Poker(hand_size=hand_size, num_rounds=num_rounds)
-        player1Sequence = [] # The sequence is state, action, reward, newState
-        # For player2 is oracle player usecase.
-        if isinstance(player1, OraclePlayer) or isinstance(player2, OraclePlayer):
-            leducGame.future_cards_for_oracle = leducGame.state['deck'].draw(2)
-            leducGame.state['deck'].putBack(leducGame.future_cards_for_oracle)
-        while True:
-            if leducGame.isEnd():
-                totalReward = leducGame.utility()
-                player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], totalReward, None)
-                # print('action: {}'.format(player1Sequence[-3]))
-                totalRewards.append(totalReward)
-                break
-            if leducGame.player() == 'Player1':
-                currState = leducGame.getState()
-                action = player1.getAction(leducGame)
-                leducGame.successor(leducGame.state, action)
-                newState = leducGame.getState()
-                player1Sequence.append(currState) # currState
-                player1Sequence.append(action) # action
-                player1Sequence.append(0.0) # reward
+# workers > 1 shards the trials across a process pool, see simulateParallel().
+# seed makes the run reproducible: with workers == 1 it seeds the random module,
+# otherwise it derives one seed per shard.
+# stats: a SimulationStats to fill with per-phase timings, reported at every
+# progress line. profile: run under cProfile and write |profile|.prof and
+# |profile|.collapsed (see writeProfile()). log: a
+# trajectories.TrajectoryWriter to record every game in. checkpointer: a
+# Checkpointer saving player1 as it learns. stats, log and checkpointer need
+# workers == 1, the shards' games are played in other processes.
+def simulate(player1, player2, numTrials=1000, verbose=False, sort=False, workers=1, seed=None, printEvery=10000,
+             stats=None, profile=None, log=None, checkpointer=None):
+    if profile:
+        profiler = cProfile.Profile()
+        totalRewards = profiler.runcall(simulate, player1, player2, numTrials, verbose, sort, workers, seed,
+                                        printEvery, stats, None, log, checkpointer)
+        writeProfile(profiler, profile)
+        return totalRewards
+    if workers > 1:
+        if stats:
+            raise Exception("stats are only collected with workers == 1")
+        if log is not None:
+            raise Exception("games are only logged with workers == 1")
+        if checkpointer is not None:
+            raise Exception("checkpoints are only saved with workers == 1")
+        totalRewards, _ = simulateParallel(player1, player2, numTrials, workers, seed)
+        return totalRewards
+    if seed is not None:
+        random.seed(seed)
+    if stats:
+        clock = SimulationStats.clock
+        stats.start()
+        handStrength.rank = stats.timed('handStrength', HandStrengthCache.rank.__get__(handStrength))
+
+    try:
+        # Return i in [0, ..., len(probs)-1] with probability probs[i].
+        num_rounds = 5
+        hand_size = 2
+
+        totalRewards = []  # The rewards we get on each trial
+        for trial in range(numTrials):
+            if stats: start = clock()
+            leducGame = Poker(hand_size=hand_size, num_rounds=num_rounds)
+            player1Sequence = [] # The sequence is state, action, reward, newState
+            actions = []
+            # For player2 is oracle player usecase.
+            if isinstance(player1, OraclePlayer) or isinstance(player2, OraclePlayer):
+                leducGame.future_cards_for_oracle = leducGame.state['deck'].draw(2)
+                leducGame.state['deck'].putBack(leducGame.future_cards_for_oracle)
+                leducGame.oracleContext = OracleContext(leducGame)
+            if stats:
+                stats.add('deal', clock() - start)
+                leducGame.getState = stats.timed('getState', leducGame.getState)
+            while True:
                 if leducGame.isEnd():
-                    player1Sequence.append(newState) # newState
-                # print('action: {}'.format(action))
-            elif leducGame.player() == 'Player2':
-                action = player2.getAction(leducGame)
-                leducGame.successor(leducGame.state, action)
-                if leducGame.player() == 'Player1' or leducGame.isEnd():
-                    player1Sequence.append(leducGame.getState())
-                if leducGame.player() == 'Player1':
-                    player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], 0, player1Sequence[-1])
-            else:
-                action = 'draw_card'
-                leducGame.successor(leducGame.state, action)
-                if leducGame.player() == 'Player1' or leducGame.isEnd():
-                    player1Sequence.append(leducGame.getState())
+                    if stats: start = clock()
+                    totalReward = leducGame.utility()
+                    if stats: stats.add('utility', clock() - start)
+                    if stats: start = clock()
+                    player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], totalReward, None)
+                    if stats: stats.add('incorporateFeedback', clock() - start)
+                    # print('action: {}'.format(player1Sequence[-3]))
+                    totalRewards.append(totalReward)
+                    if log is not None:
+                        log.add(leducGame, actions, totalReward)
+                    if checkpointer is not None:
+                        checkpointer.gameFinished(player1)
+                    break
                 if leducGame.player() == 'Player1':
-                    player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], 0, player1Sequence[-1])
-
-        if trial % 10000 == 0:
-            print('******* Game {} *******'.format(trial))
-            print('avg utility so far: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-
+                    currState = leducGame.getState()
+                    if stats: start = clock()
+                    action = player1.getAction(leducGame)
+                    if stats: stats.add('player1Action', clock() - start)
+                    actions.append(action)
+                    leducGame.successor(leducGame.state, action)
+                    newState = leducGame.getState()
+                    player1Sequence.append(currState) # currState
+                    player1Sequence.append(action) # action
+                    player1Sequence.append(0.0) # reward
+                    if leducGame.isEnd():
+                        player1Sequence.append(newState) # newState
+                    # print('action: {}'.format(action))
+                elif leducGame.player() == 'Player2':
+                    if stats: start = clock()
+                    action = player2.getAction(leducGame)
+                    if stats: stats.add('player2Action', clock() - start)
+                    actions.append(action)
+                    leducGame.successor(leducGame.state, action)
+                    if leducGame.player() == 'Player1' or leducGame.isEnd():
+                        player1Sequence.append(leducGame.getState())
+                    if leducGame.player() == 'Player1':
+                        if stats: start = clock()
+                        player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], 0, player1Sequence[-1])
+                        if stats: stats.add('incorporateFeedback', clock() - start)
+                else:
+                    action = 'draw_card'
+                    actions.append(action)
+                    leducGame.successor(leducGame.state, action)
+                    if leducGame.player() == 'Player1' or leducGame.isEnd():
+                        player1Sequence.append(leducGame.getState())
+                    if leducGame.player() == 'Player1':
+                        if stats: start = clock()
+                        player1.incorporateFeedback(player1Sequence[-4], player1Sequence[-3], 0, player1Sequence[-1])
+                        if stats: stats.add('incorporateFeedback', clock() - start)
+
+            if stats:
+                stats.games += 1
+            if printEvery and trial % printEvery == 0:
+                print('******* Game {} *******'.format(trial))
+                print('avg utility so far: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
+                if stats:
+                    stats.report()
+
+    finally:
+        if stats:
+            stats.stop()
+            del handStrength.rank
+    if log is not None:
+        log.flush()
+    if checkpointer is not None:
+        checkpointer.wait()
     return totalRewards
 
+class SimulationStats:
+    '''
+    Wall time and call counts of each phase of simulate(), filled in when
+    passed as simulate(..., stats=SimulationStats()).
+      deal: creating each game and the oracle's future cards
+      getState: every state copy, including the ones the agents make
+      player1Action, player2Action: the agents' getAction()
+      incorporateFeedback: player1's learning updates
+      handStrength: hand strength lookups, whoever asks for them
+      utility: the final utility of each game
+    getState and handStrength also count towards the phase they happen in.
+    '''
+    PHASES = ['deal', 'getState', 'player1Action', 'player2Action',
+              'incorporateFeedback', 'handStrength', 'utility']
+    clock = staticmethod(timeit.default_timer)
+
+    def __init__(self):
+        self.seconds = dict((phase, 0.0) for phase in self.PHASES)
+        self.calls = dict((phase, 0) for phase in self.PHASES)
+        self.games = 0
+        self.elapsed = 0.0
+        self.started = None
+
+    def start(self):
+        self.started = self.clock()
+
+    def stop(self):
+        self.elapsed += self.clock() - self.started
+        self.started = None
+
+    def wallTime(self):
+        if self.started is None:
+            return self.elapsed
+        return self.elapsed + self.clock() - self.started
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def timed(self, phase, fn):
+        def timedFn(*args):
+            start = self.clock()
+            try:
+                return fn(*args)
+            finally:
+                self.add(phase, self.clock() - start)
+        return timedFn
+
+    def report(self):
+        wall = max(self.wallTime(), 1e-9)
+        decisions = self.calls['player1Action'] + self.calls['player2Action']
+        print('games/sec: {:.1f}, decisions/sec: {:.1f}, wall time: {:.2f}s'.format(
+            self.games / wall, decisions / wall, wall))
+        for phase in self.PHASES:
+            calls = self.calls[phase]
+            print('  {:<20} {:9.3f}s {:9d} calls {:9.2f}us/call {:6.1f}%'.format(
+                phase, self.seconds[phase], calls, self.seconds[phase] * 1e6 / max(calls, 1),
+                self.seconds[phase] * 100.0 / wall))
+
+# Writes |profiler|'s results to |prefix|.prof (for pstats and friends) and
+# |prefix|.collapsed, one 'root;caller;callee microseconds' line per call path
+# as flamegraph.pl expects, and prints the top functions.
+def writeProfile(profiler, prefix):
+    profiler.dump_stats(prefix + '.prof')
+    stats = pstats.Stats(profiler)
+    with open(prefix + '.collapsed', 'w') as f:
+        for stack, seconds in sorted(collapsedStacks(stats).items()):
+            f.write('{} {}\n'.format(stack, int(round(seconds * 1e6))))
+    stats.sort_stats('cumulative').print_stats(15)
+
+# cProfile only records caller/callee pairs, so full call paths are rebuilt by
+# walking down from the roots and splitting each function's time between its
+# callers in proportion to the time each of them spent calling it.
+def collapsedStacks(stats, minSeconds=1e-6):
+    def label(func):
+        filename, line, name = func
+        return '{}:{}'.format(os.path.basename(filename), name) if line else name
+
+    callees = defaultdict(dict)
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge
+
+    stacks = defaultdict(float)
+    def walk(func, path, cumulative):
+        totalCumulative = stats.stats[func][3]
+        share = cumulative / totalCumulative if totalCumulative else 0.0
+        path = path + [func]
+        stacks[';'.join(label(f) for f in path)] += stats.stats[func][2] * share
+        for callee, (cc, nc, tt, ct) in callees[func].items():
+            if callee not in path and ct * share >= minSeconds:
+                walk(callee, path, ct * share)
+
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            walk(func, [], ct)
+    return stacks
+
+def simulateShard(args):
+    player1, player2, numTrials, seed = args
+    return simulate(player1, player2, numTrials, seed=seed, printEvery=0)
+
+# Runs simulate() in |workers| processes, one shard of trials each, and
+# concatenates the rewards in shard order. Every shard seeds the random module
+# (deck, random players, exploration) with its own seed derived from |seed|, so
+# the result is bit-identical for a given seed and worker count.
+# Each shard plays with its own copy of the players, so learning done inside
+# the shards is discarded: use it for evaluation (explorationProb=0.0).
+# Returns (totalRewards, stats): the numTrials rewards and their
+# rewardStatistics(), {'games', 'mean', 'std', 'stderr'}, also printed.
+# The shards run on a multiprocessing.Pool, as Python 2 has no
+# concurrent.futures.ProcessPoolExecutor.
+def simulateParallel(player1, player2, numTrials, workers, seed=None):
+    seeds = random.Random(seed)
+    sizes = [numTrials // workers + (1 if i < numTrials % workers else 0) for i in range(workers)]
+    shards = [(player1, player2, size, seeds.getrandbits(32)) for size in sizes]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        shardRewards = pool.map(simulateShard, shards)
+    finally:
+        pool.close()
+        pool.join()
+
+    totalRewards = [reward for rewards in shardRewards for reward in rewards]
+    stats = rewardStatistics(totalRewards)
+    print('******* {} games on {} workers *******'.format(stats['games'], workers))
+    print('avg utility: {:.4f} +/- {:.4f}'.format(stats['mean'], stats['stderr']))
+    return totalRewards, stats
+
+def rewardStatistics(totalRewards):
+    rewards = np.asarray(totalRewards, dtype=float)
+    std = rewards.std() if len(rewards) else 0.0
+    return {
+        'games': len(rewards),
+        'mean': rewards.mean() if len(rewards) else 0.0,
+        'std': std,
+        'stderr': std / math.sqrt(max(len(rewards), 1)),
+    }
+
 #################
 # Player Agents #
 #################
@@ -272,7 +977,24 @@ class RandomPlayer(Player):
     def getAction(self, game):
         return random.choice(game.legalActions(game.getState()))
 
+    def actionProbabilities(self, game):
+        actions = game.legalActions(game.state)
+        return dict((action, 1.0 / len(actions)) for action in actions)
+
+# |equity|: optional function (hand, board) -> equity, such as
+# handStrength.equity or handStrength.sampledEquity, to play by the chance of
+# winning instead of the current hand rank.
 class BaselinePlayer(Player):
+    def __init__(self, equity=None):
+        self.equity = equity
+
+    def strengthPct(self, game, hand):
+        if self.equity is not None:
+            # same scale as the rank percentage, 0.0 is the best
+            return 1.0 - self.equity(hand, game.state['communityCards'])
+        hand_strength = handStrength.rank(hand, game.state['communityCards'])
+        return game.evaluator.get_five_card_rank_percentage(hand_strength)
+
     def getAction(self, game):
         def action_given_hand_strength_pct(hand_strength_pct):
             #print('hand_strength_pct: {}'.format(hand_strength_pct))
@@ -289,54 +1011,54 @@ class BaselinePlayer(Player):
                     return action
 
         if game.player() == 'Player1':
-            hand_strength = game.evaluator.evaluate(game.state['player1Hand'], game.state['communityCards'])
-            hand_strength_pct = game.evaluator.get_five_card_rank_percentage(hand_strength)
-            return action_given_hand_strength_pct(hand_strength_pct)
+            return action_given_hand_strength_pct(self.strengthPct(game, game.state['player1Hand']))
 
         elif game.player() == 'Player2':
-            hand_strength = game.evaluator.evaluate(game.state['player2Hand'], game.state['communityCards'])
-            hand_strength_pct = game.evaluator.get_five_card_rank_percentage(hand_strength)
-            return action_given_hand_strength_pct(hand_strength_pct)
+            return action_given_hand_strength_pct(self.strengthPct(game, game.state['player2Hand']))
 
         else:
             return 'draw_card'
 
-class OraclePlayer(Player):
-    def getAction(self, game):
-        def action_given_hand_both_strength_pct(my_hand_strength_pct, opponent_hand_strength_pct, full_community_cards):
-            # print('my_hand_strength_pct: {}, opponent_hand_strength_pct: {}'.format(my_hand_strength_pct, opponent_hand_strength_pct))
-            # fold, check, bet, call, raise
-            if my_hand_strength_pct < opponent_hand_strength_pct:
-                    return 'fold'
-            else:
-                if 'raise' in game.legalActions(game.getState()):
-                    return 'raise'
-                elif 'call' in game.legalActions(game.getState()):
-                    return 'call'
-                elif 'bet' in game.legalActions(game.getState()):
-                    return 'bet'
-                else:
-                    return 'check'
-
+# What the oracle knows about a game: both hands and the whole board, hence
+# the showdown. The cards are fixed once simulate() has set aside
+# |future_cards_for_oracle|, so the ranks are computed once per game.
+class OracleContext:
+    def __init__(self, game):
         full_community_cards = game.state['communityCards']
         if len(game.state['communityCards']) == 3:
             full_community_cards = game.state['communityCards'] + game.future_cards_for_oracle
         elif len(game.state['communityCards']) == 4:
             full_community_cards = game.state['communityCards'] + [game.future_cards_for_oracle[0]]
 
-        hand_strength1 = game.evaluator.evaluate(game.state['player1Hand'], full_community_cards)
-        hand_strength_pct1 = game.evaluator.get_five_card_rank_percentage(hand_strength1)
-        hand_strength2 = game.evaluator.evaluate(game.state['player2Hand'], full_community_cards)
-        hand_strength_pct2 = game.evaluator.get_five_card_rank_percentage(hand_strength2)
-
-        if game.player() == 'Player1':
-            return action_given_hand_both_strength_pct(hand_strength_pct1, hand_strength_pct2, full_community_cards)
+        hand_strength1 = handStrength.rank(game.state['player1Hand'], full_community_cards)
+        hand_strength2 = handStrength.rank(game.state['player2Hand'], full_community_cards)
+        # a player folds when its rank is lower than the opponent's
+        self.folds = {
+            'Player1': hand_strength1 < hand_strength2,
+            'Player2': hand_strength2 < hand_strength1,
+        }
 
-        elif game.player() == 'Player2':
-            return action_given_hand_both_strength_pct(hand_strength_pct2, hand_strength_pct1, full_community_cards)
+class OraclePlayer(Player):
+    def getAction(self, game):
+        player = game.player()
+        if player == 'Dealer':
+            return 'draw_card'
 
+        if game.oracleContext is None:
+            game.oracleContext = OracleContext(game)
+        if game.oracleContext.folds[player]:
+            return 'fold'
+
+        # fold, check, bet, call, raise
+        actions = game.legalActions(game.state)
+        if 'raise' in actions:
+            return 'raise'
+        elif 'call' in actions:
+            return 'call'
+        elif 'bet' in actions:
+            return 'bet'
         else:
-            return 'draw_card'
+            return 'check'
 
 # Abstract class: an RLAlgorithm performs reinforcement learning.  All it needs
 # to know is the set of available actions to take.  The simulator (see
@@ -362,18 +1084,19 @@ class RLAlgorithm:
 # explorationProb: the epsilon value indicating how frequently the policy
 # returns a random action
 class QLearningAlgorithm(RLAlgorithm):
-    def __init__(self, actions, featureExtractor, explorationProb=0.2):
+    def __init__(self, actions, featureExtractor, explorationProb=0.2, featureSpace=None):
         self.featureExtractor = featureExtractor
+        self.featureSpace = featureSpace or featureSpaceFor(featureExtractor)
         self.actions = actions
         self.explorationProb = explorationProb
-        self.weights = defaultdict(float)
+        self.weights = np.zeros(self.featureSpace.size())
         self.numIters = 0
 
     # Return the Q function associated with the weights and features
     def getQ(self, state, action):
         score = 0
-        for f, v in self.featureExtractor(state, action):
-            score += self.weights[f] * v
+        for i, v in self.featureSpace.features(state, action):
+            score += self.weights[i] * v
         return score
 
     # This algorithm will produce an action given a state.
@@ -384,9 +1107,21 @@ class QLearningAlgorithm(RLAlgorithm):
         if random.random() < self.explorationProb:
             return random.choice(self.actions(game.getState()))
         else:
-            actions = self.actions(game.getState())
+            state = game.getState()
+            actions = self.actions(state)
             random.shuffle(actions)
-            return max((self.getQ(game.getState(), action), action) for action in actions)[1]
+            return max((self.getQ(state, action), action) for action in actions)[1]
+
+    # The probability of each action getAction() may return: a uniformly
+    # random action with probability |explorationProb|, the best one
+    # otherwise (ties between Q values go to the greater action name).
+    def actionProbabilities(self, game):
+        state = game.getState()
+        actions = self.actions(state)
+        probabilities = dict((action, self.explorationProb / len(actions)) for action in actions)
+        best = max((self.getQ(state, action), action) for action in actions)[1]
+        probabilities[best] += 1.0 - self.explorationProb
+        return probabilities
 
     # Call this function to get the step size to update the weights.
     def getStepSize(self):
@@ -403,15 +1138,319 @@ class QLearningAlgorithm(RLAlgorithm):
             V_estimate_new_state = max([self.getQ(newState, a) for a in self.actions(newState)])
 
         new_Q_estimate = reward + V_estimate_new_state
-        current_Q_estimate = self.getQ(state, action)
+        features = self.featureSpace.features(state, action)
+        current_Q_estimate = 0
+        for i, v in features:
+            current_Q_estimate += self.weights[i] * v
         step_size = self.getStepSize()
-        for f, v in self.featureExtractor(state, action):
-            self.weights[f] += step_size * (new_Q_estimate - current_Q_estimate)*v
+        for i, v in features:
+            self.weights[i] += step_size * (new_Q_estimate - current_Q_estimate)*v
         # END_YOUR_CODE
 
+    # Return the learned weights by feature name, like the old defaultdict weights.
+    def namedWeights(self):
+        return dict((self.featureSpace.keyOf(i), self.weights[i]) for i in np.flatnonzero(self.weights))
+
+    # Writes the weights, feature names, numIters, explorationProb and the
+    # state of the random module to |path|, see Checkpoint.
+    def saveCheckpoint(self, path, numGames=0):
+        Checkpoint.fromAlgorithm(self, numGames).write(path)
+
+    # Returns a QLearningAlgorithm resumed from the checkpoint at |path|.
+    # With |restoreRandom| the random module continues where it was when the
+    # checkpoint was taken. |featureExtractor| is looked up by the name saved
+    # in the checkpoint unless given, which extractors defined outside this
+    # module must be.
+    @staticmethod
+    def loadCheckpoint(path, actions=legalActions, restoreRandom=True, featureExtractor=None):
+        return Checkpoint.read(path).toAlgorithm(actions, restoreRandom, featureExtractor)
+
+# Everything needed to resume a QLearningAlgorithm. The binary file holds
+#   header: 8 byte magic, uint32 version, uint32 flags (1 if the random state
+#     has a gauss_next), uint64 numIters, uint64 numGames, float64
+#     explorationProb, uint64 number of weights, uint32 hash buckets, uint32
+#     extractor name length, uint32 feature names length
+#   the feature extractor's name
+#   the declared feature names in index order, repr()'d and zlib compressed
+#   the random module state: uint32 version, 625 uint32, float64 gauss_next
+#   the weights as float64
+# all little endian. Files are written next to their destination and renamed.
+class Checkpoint:
+    FILE_MAGIC = 'LEDUCQCK'
+    FILE_VERSION = 1
+    HEADER = struct.Struct('<8sIIQQdQIII')
+    RANDOM_STATE = struct.Struct('<I625Id')
+
+    # |encodedKeys|: the feature names as stored, see FeatureSpace.encodedKeys()
+    def __init__(self, extractorName, encodedKeys, hashBuckets, weights, numIters, explorationProb,
+                 randomState, numGames=0):
+        self.extractorName = extractorName
+        self.encodedKeys = encodedKeys
+        self.hashBuckets = hashBuckets
+        self.weights = weights
+        self.numIters = numIters
+        self.explorationProb = explorationProb
+        self.randomState = randomState
+        self.numGames = numGames
+
+    @staticmethod
+    def fromAlgorithm(algorithm, numGames=0):
+        space = algorithm.featureSpace
+        return Checkpoint(algorithm.featureExtractor.__name__, space.encodedKeys(), space.hashBuckets,
+                          algorithm.weights.copy(), algorithm.numIters, algorithm.explorationProb,
+                          random.getstate(), numGames)
+
+    def toAlgorithm(self, actions=legalActions, restoreRandom=True, featureExtractor=None):
+        if featureExtractor is None:
+            if self.extractorName not in globals():
+                raise Exception("Unknown feature extractor {}, pass it to toAlgorithm()".format(self.extractorName))
+            featureExtractor = globals()[self.extractorName]
+        space = featureSpaceFor(featureExtractor)
+        if space.encodedKeys() != self.encodedKeys or space.hashBuckets != self.hashBuckets:
+            # declared differently when it was saved, the indexer no longer applies
+            keys = ast.literal_eval(zlib.decompress(self.encodedKeys))
+            space = FeatureSpace(featureExtractor, keys, hashBuckets=self.hashBuckets)
+        algorithm = QLearningAlgorithm(actions, featureExtractor, self.explorationProb, space)
+        algorithm.weights = np.array(self.weights, dtype=float)
+        algorithm.numIters = self.numIters
+        if restoreRandom:
+            random.setstate(self.randomState)
+        return algorithm
+
+    def encode(self):
+        name = self.extractorName
+        keys = self.encodedKeys
+        version, internal, gauss = self.randomState
+        header = self.HEADER.pack(self.FILE_MAGIC, self.FILE_VERSION, 0 if gauss is None else 1,
+                                  self.numIters, self.numGames, self.explorationProb, len(self.weights),
+                                  self.hashBuckets, len(name), len(keys))
+        randomState = self.RANDOM_STATE.pack(version, *(internal + (gauss or 0.0,)))
+        weights = np.asarray(self.weights, dtype='<f8').tostring()
+        return ''.join([header, name, keys, randomState, weights])
+
+    @staticmethod
+    def decode(data):
+        (magic, version, flags, numIters, numGames, explorationProb, numWeights, hashBuckets,
+         nameLength, keysLength) = Checkpoint.HEADER.unpack_from(data, 0)
+        if magic != Checkpoint.FILE_MAGIC or version != Checkpoint.FILE_VERSION:
+            raise Exception("Invalid checkpoint file")
+
+        offset = Checkpoint.HEADER.size
+        name = data[offset:offset + nameLength]
+        offset += nameLength
+        keys = data[offset:offset + keysLength]
+        offset += keysLength
+        randomState = Checkpoint.RANDOM_STATE.unpack_from(data, offset)
+        offset += Checkpoint.RANDOM_STATE.size
+        weights = np.frombuffer(data, dtype='<f8', count=numWeights, offset=offset).astype(float)
+
+        randomState = (randomState[0], tuple(randomState[1:-1]), randomState[-1] if flags & 1 else None)
+        return Checkpoint(name, keys, hashBuckets, weights, numIters, explorationProb, randomState, numGames)
+
+    def write(self, path):
+        writeAtomically(path, self.encode())
+
+    @staticmethod
+    def read(path):
+        with open(path, 'rb') as f:
+            return Checkpoint.decode(f.read())
+
+def writeAtomically(path, data):
+    tmpPath = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmpPath, 'wb') as f:
+        f.write(data)
+    os.rename(tmpPath, path)
+
+# Checkpoints a learner to |path| every |every| games of simulate(..., 
+# checkpointer=...). The checkpoint is encoded between two games, which takes
+# well under a millisecond, and written to disk by a background thread while
+# training goes on. |numGames| counts the games played before this run, so
+# that a resumed run keeps counting from there.
+class Checkpointer:
+    def __init__(self, path, every=10000, numGames=0):
+        self.path = path
+        self.every = every
+        self.numGames = numGames
+        self.writer = None
+
+    def gameFinished(self, algorithm):
+        self.numGames += 1
+        if self.numGames % self.every == 0:
+            self.save(algorithm)
+
+    def save(self, algorithm):
+        data = Checkpoint.fromAlgorithm(algorithm, self.numGames).encode()
+        self.wait()
+        self.writer = threading.Thread(target=writeAtomically, args=(self.path, data))
+        self.writer.start()
+
+    def wait(self):
+        if self.writer is not None:
+            self.writer.join()
+            self.writer = None
+
+# Fixed capacity ring buffer of Q-learning transitions, stored as arrays of
+# feature indices rather than game states. Once |capacity| transitions are
+# stored each new one overwrites the oldest.
+# Row t holds:
+#   indices, values: the (index, value) features of (s, a), padded with zeros
+#     to |maxFeatures|
+#   actions: ACTION_IDS[a]
+#   rewards: r
+#   terminal: True if s' is None
+#   nextIndices, nextValues: the features of (s', a') for each a' in ACTIONS
+#   nextLegal: whether each a' is legal in s'
+class ReplayBuffer:
+    def __init__(self, capacity=1 << 16, maxFeatures=1):
+        self.capacity = capacity
+        self.maxFeatures = maxFeatures
+        self.indices = np.zeros((capacity, maxFeatures), dtype=np.int64)
+        self.values = np.zeros((capacity, maxFeatures))
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity)
+        self.terminal = np.zeros(capacity, dtype=bool)
+        self.nextIndices = np.zeros((capacity, len(ACTIONS), maxFeatures), dtype=np.int64)
+        self.nextValues = np.zeros((capacity, len(ACTIONS), maxFeatures))
+        self.nextLegal = np.zeros((capacity, len(ACTIONS)), dtype=bool)
+        self.size = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.size
+
+    def encode(self, indices, values, features):
+        if len(features) > self.maxFeatures:
+            raise Exception("Transition has {} features, buffer holds {}".format(len(features), self.maxFeatures))
+        indices[:] = 0
+        values[:] = 0.0
+        for j, (i, v) in enumerate(features):
+            indices[j] = i
+            values[j] = v
+
+    # |nextFeatures|: dict of legal action in s' => features of (s', action),
+    # or None if s' is terminal.
+    def add(self, features, action, reward, nextFeatures):
+        t = self.next
+        self.encode(self.indices[t], self.values[t], features)
+        self.actions[t] = ACTION_IDS[action]
+        self.rewards[t] = reward
+        self.terminal[t] = nextFeatures is None
+        self.nextLegal[t] = False
+        self.nextIndices[t] = 0
+        self.nextValues[t] = 0.0
+        for a, f in (nextFeatures or {}).items():
+            self.encode(self.nextIndices[t, ACTION_IDS[a]], self.nextValues[t, ACTION_IDS[a]], f)
+            self.nextLegal[t, ACTION_IDS[a]] = True
+
+        self.next = (t + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batchSize, rng=np.random):
+        return rng.randint(self.size, size=batchSize)
+
+# Q-learning from a replay buffer: every transition is stored, and every
+# |updateEvery| transitions a minibatch of |batchSize| stored transitions is
+# replayed in a single vectorized update, with targets computed from the
+# current weights.
+class ReplayQLearningAlgorithm(QLearningAlgorithm):
+    def __init__(self, actions, featureExtractor, explorationProb=0.2, featureSpace=None,
+                 capacity=1 << 16, batchSize=32, updateEvery=1, maxFeatures=1, seed=None):
+        QLearningAlgorithm.__init__(self, actions, featureExtractor, explorationProb, featureSpace)
+        self.replay = ReplayBuffer(capacity, maxFeatures)
+        self.batchSize = batchSize
+        self.updateEvery = updateEvery
+        self.rng = np.random.RandomState(seed)
+        self.numTransitions = 0
+
+    def incorporateFeedback(self, state, action, reward, newState):
+        nextFeatures = None
+        if newState != None:
+            nextFeatures = dict((a, self.featureSpace.features(newState, a)) for a in self.actions(newState))
+        self.replay.add(self.featureSpace.features(state, action), action, reward, nextFeatures)
+
+        self.numTransitions += 1
+        if self.numTransitions % self.updateEvery == 0:
+            self.update(self.replay.sample(self.batchSize, self.rng))
+
+    # One gradient step on the transitions at rows |batch| of the buffer.
+    def update(self, batch):
+        replay = self.replay
+        nextQ = (self.weights[replay.nextIndices[batch]] * replay.nextValues[batch]).sum(axis=2)
+        nextQ = np.where(replay.nextLegal[batch], nextQ, -np.inf).max(axis=1)
+        target = replay.rewards[batch] + np.where(replay.terminal[batch], 0.0, nextQ)
+
+        indices = replay.indices[batch]
+        values = replay.values[batch]
+        current = (self.weights[indices] * values).sum(axis=1)
+        step = self.getStepSize() * (target - current)
+        np.add.at(self.weights, indices.ravel(), (step[:, np.newaxis] * values).ravel())
+
+#################
+# Feature Space #
+#################
+class FeatureSpace:
+    '''
+    Maps the (feature name, feature value) pairs of a feature extractor to
+    dense integer indices, so that weights can live in a NumPy array.
+      extractor: the feature extractor, returning (feature name, value) pairs
+      keys: declared feature names, keys[i] has index i
+      indexer: optional function (state, action) -> [(index, value)] that
+          computes the indices of declared features directly, without
+          building the feature names
+      hashBuckets: feature names that were not declared are hashed into this
+          many slots after the declared ones (hashing trick)
+    '''
+    def __init__(self, extractor, keys=(), indexer=None, hashBuckets=1 << 12):
+        self.extractor = extractor
+        self.keys = list(keys)
+        self.index = dict((k, i) for i, k in enumerate(self.keys))
+        self.indexer = indexer
+        self.hashBuckets = hashBuckets
+        self.encoded = None
+
+    def size(self):
+        return len(self.keys) + self.hashBuckets
+
+    def indexOf(self, key):
+        i = self.index.get(key)
+        if i is None:
+            if not self.hashBuckets:
+                raise KeyError(key)
+            i = len(self.keys) + hash(key) % self.hashBuckets
+        return i
+
+    def keyOf(self, i):
+        if i < len(self.keys):
+            return self.keys[i]
+        return ('hashed', i - len(self.keys))
+
+    def features(self, state, action):
+        if self.indexer is not None:
+            return self.indexer(self, state, action)
+        return self.keyFeatures(state, action)
+
+    def keyFeatures(self, state, action):
+        return [(self.indexOf(f), v) for f, v in self.extractor(state, action)]
+
+    # The declared feature names repr()'d and compressed, as checkpoints
+    # store them. Computed once, keys are not expected to change.
+    def encodedKeys(self):
+        if self.encoded is None:
+            self.encoded = zlib.compress(repr(self.keys))
+        return self.encoded
+
+# Declared feature spaces of the extractors below, looked up by featureSpaceFor().
+FEATURE_SPACES = {}
+
+def featureSpaceFor(featureExtractor):
+    space = FEATURE_SPACES.get(featureExtractor)
+    if space is None:
+        space = FeatureSpace(featureExtractor)
+    return space
+
 # Return a single indicator of the (hand strength (rounded to 1 decimal place), action)
 def handActionFeatureExtractor(state, action):
-    hand_strength = evaluator.evaluate(state['player1Hand'], state['communityCards'])
+    hand_strength = handStrength.rank(state['player1Hand'], state['communityCards'])
     hand_strength_pct = evaluator.get_five_card_rank_percentage(hand_strength)
     rounded_hand_strength = '{0:.1f}'.format(hand_strength_pct)
 
@@ -419,7 +1458,7 @@ def handActionFeatureExtractor(state, action):
 
 # Return a single indicator of the (hand strength (rounded to 1 decimal place), pot, action)
 def handPotActionFeatureExtractor(state, action):
-    hand_strength = evaluator.evaluate(state['player1Hand'], state['communityCards'])
+    hand_strength = handStrength.rank(state['player1Hand'], state['communityCards'])
     hand_strength_pct = evaluator.get_five_card_rank_percentage(hand_strength)
     rounded_hand_strength = '{0:.1f}'.format(hand_strength_pct)
     pot = sum(state['player1Bets']) + sum(state['player2Bets'])
@@ -428,7 +1467,7 @@ def handPotActionFeatureExtractor(state, action):
 
 # Return a single indicator of the (hand strength (rounded to 1 decimal place), pot, round #, action)
 def handPotRoundsActionFeatureExtractor(state, action):
-    hand_strength = evaluator.evaluate(state['player1Hand'], state['communityCards'])
+    hand_strength = handStrength.rank(state['player1Hand'], state['communityCards'])
     hand_strength_pct = evaluator.get_five_card_rank_percentage(hand_strength)
     rounded_hand_strength = '{0:.1f}'.format(hand_strength_pct)
     pot = sum(state['player1Bets']) + sum(state['player2Bets'])
@@ -436,171 +1475,64 @@ def handPotRoundsActionFeatureExtractor(state, action):
 
     return [((rounded_hand_strength, pot, round_num, action), 1.0)]    
 
-# print('Oracle vs. Random')
-# utilities3 = []
-# # Simulate oracle player against random player
-# for i in xrange(N):
-#     oracle_player = OraclePlayer()
-#     random_player = RandomPlayer()
-
-#     leducGame = Poker(hand_size=hand_size, num_rounds=num_rounds)
-#     self.future_cards_for_oracle = leducGame.state['deck'].draw(2)
-#     leducGame.state['deck'].putBack(self.future_cards_for_oracle)
-#     while True:
-#         if leducGame.isEnd():
-#             #print('utility: {}'.format(leducGame.utility()))
-#             utilities3.append(leducGame.utility())
-#             break
-#         #print('player: {}'.format(leducGame.player()))
-#         #print('legal legalActions: {}'.format(leducGame.legalActions()))
-#         if leducGame.player() == 'Player1':
-#             action = oracle_player.getAction(leducGame)
-#         elif leducGame.player() == 'Player2':
-#             action = random_player.getAction(leducGame)
-#         else:
-#             action = 'draw_card'
-        
-#         # print('action take: {}'.format(action))
-#         leducGame.successor(leducGame.state, action)
-#     if i % 1000 == 0:
-#         print("************game:{}***************".format(i))
-
-# print('avg utility: {}'.format(sum(utilities3)*1.0/len(utilities3)))
-
-
-# baseline_player = BaselinePlayer()
-# random_player = RandomPlayer()
-# totalRewards = simulate(baseline_player, random_player, numTrials=1000)
-
-# print('avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-
-# print('Random vs. Random')
-# random_player = RandomPlayer()
-# totalRewards = simulate(random_player, random_player, numTrials=5000)
-
-# print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-# print('==============')
-
-# print('Baseline vs. Random')
-# baseline_player = BaselinePlayer()
-# random_player = RandomPlayer()
-# totalRewards = simulate(baseline_player, random_player, numTrials=5000)
-
-# print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-# print('==============')
-
-#-------------------Trainning-------------------#
-print('=========================')
-print('Hand Action RL vs. Random')
-print('=========================')
-hand_action_rl_player = QLearningAlgorithm(legalActions, handActionFeatureExtractor, explorationProb=0.2)
-random_player = RandomPlayer()
-totalRewards = simulate(hand_action_rl_player, random_player, numTrials=50000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-#-------------------Evaluation-------------------#
-hand_action_rl_player.explorationProb = 0.0
-totalRewards = simulate(hand_action_rl_player, random_player, numTrials=10000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-
-# print('Weights Learned:')
-# weights =  sorted([(k, v) for k, v in hand_action_rl_player.weights.items()], key=lambda x: x[1])
-
-# for k, v in weights:
-#     if v != 0:
-#         print('{}: {:.2f}'.format(k, v))
-
-#-------------------Trainning-------------------#
-print('=============================')
-print('Hand Pot Action RL vs. Random')
-print('=============================')
-hand_pot_action_rl_player = QLearningAlgorithm(legalActions, handPotActionFeatureExtractor, explorationProb=0.2)
-random_player = RandomPlayer()
-
-totalRewards = simulate(hand_pot_action_rl_player, random_player, numTrials=50000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-#-------------------Evaluation-------------------#
-hand_pot_action_rl_player.explorationProb = 0.0
-totalRewards = simulate(hand_pot_action_rl_player, random_player, numTrials=10000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-
-# print('Weights Learned:')
-# weights =  sorted([(k, v) for k, v in hand_pot_action_rl_player.weights.items()], key=lambda x: x[1])
-
-# for k, v in weights:
-#     if v != 0:
-#         print('{}: {:.2f}'.format(k, v))
-
-#-------------------Trainning-------------------#
-print('========================================')
-print('Hand Pot Action Num Rounds RL vs. Random')
-print('========================================')
-hand_pot_rounds_action_rl_player = QLearningAlgorithm(legalActions, handPotRoundsActionFeatureExtractor, explorationProb=0.2)
-random_player = RandomPlayer()
-
-totalRewards = simulate(hand_pot_rounds_action_rl_player, random_player, numTrials=50000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-#-------------------Evaluation-------------------#
-hand_pot_rounds_action_rl_player.explorationProb = 0.0
-totalRewards = simulate(hand_pot_rounds_action_rl_player, random_player, numTrials=10000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-
-# print('Weights Learned:')
-# weights =  sorted([(k, v) for k, v in hand_pot_rounds_action_rl_player.weights.items()], key=lambda x: x[1])
-
-# for k, v in weights:
-#     if v != 0:
-#         print('{}: {:.2f}'.format(k, v))
-
-#-------------------Trainning-------------------#
-print('==========================================')
-print('Hand Pot Action Num Rounds RL vs. Baseline')
-print('==========================================')
-hand_pot_rounds_action_rl_player = QLearningAlgorithm(legalActions, handPotRoundsActionFeatureExtractor, explorationProb=0.2)
-baseline_player = BaselinePlayer()
-
-totalRewards = simulate(hand_pot_rounds_action_rl_player, baseline_player, numTrials=50000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-#-------------------Evaluation-------------------#
-hand_pot_rounds_action_rl_player.explorationProb = 0.0
-totalRewards = simulate(hand_pot_rounds_action_rl_player, baseline_player, numTrials=10000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-
-# print('Weights Learned:')
-# weights =  sorted([(k, v) for k, v in hand_pot_rounds_action_rl_player.weights.items()], key=lambda x: x[1])
-
-# for k, v in weights:
-#     if v != 0:
-#         print('{}: {:.2f}'.format(k, v))
-
-
-#-------------------Trainning-------------------#
-print('==========================================')
-print('Hand Pot Action Num Rounds RL vs. Oracle')
-print('==========================================')
-hand_pot_rounds_action_rl_player = QLearningAlgorithm(legalActions, handPotRoundsActionFeatureExtractor, explorationProb=0.2)
-oracle_player = OraclePlayer()
-
-totalRewards = simulate(hand_pot_rounds_action_rl_player, oracle_player, numTrials=50000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-#-------------------Evaluation-------------------#
-hand_pot_rounds_action_rl_player.explorationProb = 0.0
-totalRewards = simulate(hand_pot_rounds_action_rl_player, oracle_player, numTrials=10000)
-print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
-print('==============')
-
-print('Weights Learned:')
-weights =  sorted([(k, v) for k, v in hand_pot_rounds_action_rl_player.weights.items()], key=lambda x: x[1])
-
-for k, v in weights:
-    if v != 0:
-        print('{}: {:.2f}'.format(k, v))
+# Return a single indicator of the (Monte Carlo equity against a random hand
+# (rounded to 1 decimal place), pot, round #, action)
+def equityPotRoundsActionFeatureExtractor(state, action):
+    equity = handStrength.sampledEquity(state['player1Hand'], state['communityCards'], tolerance=0.05)
+    rounded_equity = '{0:.1f}'.format(equity)
+    pot = sum(state['player1Bets']) + sum(state['player2Bets'])
+    round_num = len(state['communityCards'])
+
+    return [((rounded_equity, pot, round_num, action), 1.0)]
+
+# Declared values of the extractor features: hand strength rounded to one
+# decimal place, pot (at most 4 chips per betting round) and number of
+# community cards. Anything outside these ranges falls back to the names.
+STRENGTHS = ['{0:.1f}'.format(i / 10.0) for i in range(11)]
+POTS = range(17)
+ROUND_NUMS = range(6)
+
+# Index of the rounded hand strength in STRENGTHS. Same rounding as
+# '{0:.1f}', since no rank / 7462 lies exactly halfway between two tenths.
+def strengthIndex(state):
+    hand_strength = handStrength.rank(state['player1Hand'], state['communityCards'])
+    return int(round(evaluator.get_five_card_rank_percentage(hand_strength) * 10))
+
+def handActionFeatureIndexer(space, state, action):
+    return [(strengthIndex(state) * len(ACTIONS) + ACTION_IDS[action], 1.0)]
 
+def handPotActionFeatureIndexer(space, state, action):
+    pot = sum(state['player1Bets']) + sum(state['player2Bets'])
+    if pot >= len(POTS):
+        return space.keyFeatures(state, action)
+    return [((strengthIndex(state) * len(POTS) + pot) * len(ACTIONS) + ACTION_IDS[action], 1.0)]
+
+def handPotRoundsActionFeatureIndexer(space, state, action):
+    pot = sum(state['player1Bets']) + sum(state['player2Bets'])
+    round_num = len(state['communityCards'])
+    if pot >= len(POTS) or round_num >= len(ROUND_NUMS):
+        return space.keyFeatures(state, action)
+    index = (strengthIndex(state) * len(POTS) + pot) * len(ROUND_NUMS) + round_num
+    return [(index * len(ACTIONS) + ACTION_IDS[action], 1.0)]
+
+FEATURE_SPACES[handActionFeatureExtractor] = FeatureSpace(
+    handActionFeatureExtractor,
+    [(s, a) for s in STRENGTHS for a in ACTIONS],
+    handActionFeatureIndexer)
+FEATURE_SPACES[handPotActionFeatureExtractor] = FeatureSpace(
+    handPotActionFeatureExtractor,
+    [(s, pot, a) for s in STRENGTHS for pot in POTS for a in ACTIONS],
+    handPotActionFeatureIndexer)
+FEATURE_SPACES[handPotRoundsActionFeatureExtractor] = FeatureSpace(
+    handPotRoundsActionFeatureExtractor,
+    [(s, pot, r, a) for s in STRENGTHS for pot in POTS for r in ROUND_NUMS for a in ACTIONS],
+    handPotRoundsActionFeatureIndexer)
+FEATURE_SPACES[equityPotRoundsActionFeatureExtractor] = FeatureSpace(
+    equityPotRoundsActionFeatureExtractor,
+    [(s, pot, r, a) for s in STRENGTHS for pot in POTS for r in ROUND_NUMS for a in ACTIONS])
+
+# The experiments live in run_experiments.py, so importing this module does
+# nothing but define the game and the agents.
+if __name__ == '__main__':
+    import run_experiments
+    run_experiments.main()
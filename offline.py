@@ -0,0 +1,119 @@
+'''
+Fitted Q-iteration: learns QLearningAlgorithm weights from games logged by
+simulate(..., log=TrajectoryWriter(path)), without playing any new games.
+
+    transitions = logTransitions(TrajectoryReader('games.trj'), featureSpace)
+    weights = fittedQIteration(transitions, featureSpace.size())
+
+or all at once with fitQLearningAlgorithm(). Extracting the transitions
+replays the logged games once, through the feature extractor only; the
+fitted weights then come from a few NumPy sweeps over them, so several
+extractors or settings can be tried on the same log cheaply.
+'''
+import random
+
+import numpy as np
+
+from leduc import Poker, QLearningAlgorithm, ReplayBuffer, legalActions
+from trajectories import TrajectoryReader
+
+# Replays a game decoded by TrajectoryReader.game(), calling
+# |visit|(state, action) at each of player1's decisions. The state is the
+# live game state, so it changes once visit() returns. Returns the game.
+def replayGame(record, visit):
+    game = Poker(num_rounds=5)
+    state = game.state
+    state['player1Hand'] = list(record['player1Hand'])
+    state['player2Hand'] = list(record['player2Hand'])
+    state['communityCards'] = record['communityCards'][:3]
+    state['deck'].shuffle()
+    state['deck'].putBack(record['communityCards'][:2:-1])
+
+    for action in record['actions']:
+        if game.player() == 'Player1':
+            visit(state, action)
+        game.successor(state, action)
+    return game
+
+# Encodes player1's transitions in the games of |reader| with the features of
+# |featureSpace|, as simulate() would have fed them to incorporateFeedback():
+# reward 0 and the next decision's state, then the final reward and no next
+# state. Returns a ReplayBuffer holding exactly these transitions, in the
+# same order.
+def logTransitions(reader, featureSpace, actions=legalActions, maxFeatures=1):
+    # at most one transition per action
+    capacity = int(reader.column('numActions').sum())
+    transitions = ReplayBuffer(max(capacity, 1), maxFeatures)
+
+    # constructing Poker deals from the random module, keep it untouched
+    randomState = random.getstate()
+    try:
+        for record in reader.games():
+            decisions = []
+            def visit(state, action):
+                if decisions:
+                    previous = decisions[-1]
+                    transitions.add(previous[0], previous[1], 0,
+                                    dict((a, featureSpace.features(state, a)) for a in actions(state)))
+                decisions.append((featureSpace.features(state, action), action))
+            game = replayGame(record, visit)
+            if not decisions:
+                continue
+            # simulate() also bootstraps from the final state when the last
+            # card hands the turn back to player1
+            if game.player() == 'Player1':
+                state = game.state
+                transitions.add(decisions[-1][0], decisions[-1][1], 0,
+                                dict((a, featureSpace.features(state, a)) for a in actions(state)))
+            transitions.add(decisions[-1][0], decisions[-1][1], record['reward'], None)
+    finally:
+        random.setstate(randomState)
+    return transitions
+
+# Fits linear Q weights to |transitions| (a ReplayBuffer) by fitted
+# Q-iteration: each iteration computes the targets r + max_a' Q(s', a') with
+# the current weights, then solves the ridge regression of the targets on
+# the features. Without discount, like QLearningAlgorithm.
+# The regression is solved by Jacobi sweeps over the features, which are
+# exact in one sweep when every transition has a single feature (the case of
+# all the extractors in leduc); |ridge| acts as that many observations of 0
+# per feature. Stops after |numIterations|, or when no weight moves by more
+# than |tolerance|.
+def fittedQIteration(transitions, numWeights, numIterations=50, ridge=1.0, tolerance=1e-6,
+                     weights=None, sweeps=1):
+    n = len(transitions)
+    indices = transitions.indices[:n]
+    values = transitions.values[:n]
+    rewards = transitions.rewards[:n]
+    terminal = transitions.terminal[:n]
+    nextIndices = transitions.nextIndices[:n]
+    nextValues = transitions.nextValues[:n]
+    nextLegal = transitions.nextLegal[:n]
+
+    flatIndices = indices.ravel()
+    scale = np.bincount(flatIndices, weights=(values * values).ravel(), minlength=numWeights) + ridge
+    weights = np.zeros(numWeights) if weights is None else np.array(weights, dtype=float)
+
+    for iteration in range(numIterations):
+        nextQ = (weights[nextIndices] * nextValues).sum(axis=2)
+        nextQ = np.where(nextLegal, nextQ, -np.inf).max(axis=1)
+        targets = rewards + np.where(terminal, 0.0, nextQ)
+
+        previous = weights.copy()
+        for sweep in range(sweeps):
+            residuals = targets - (weights[indices] * values).sum(axis=1)
+            gradient = np.bincount(flatIndices, weights=(residuals[:, np.newaxis] * values).ravel(),
+                                   minlength=numWeights) - ridge * weights
+            weights += gradient / scale
+        if np.abs(weights - previous).max() <= tolerance:
+            break
+    return weights
+
+# A greedy QLearningAlgorithm with weights fitted to the games logged in
+# |path| (a file or a TrajectoryReader).
+def fitQLearningAlgorithm(path, featureExtractor, numIterations=50, ridge=1.0):
+    reader = path if isinstance(path, TrajectoryReader) else TrajectoryReader(path)
+    player = QLearningAlgorithm(legalActions, featureExtractor, explorationProb=0.0)
+    transitions = logTransitions(reader, player.featureSpace)
+    player.weights = fittedQIteration(transitions, player.featureSpace.size(), numIterations, ridge)
+    return player
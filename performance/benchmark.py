@@ -0,0 +1,281 @@
+"""
+Benchmark suite for the deuces evaluator and the Leduc simulator.
+
+Every benchmark is a batch of `number` operations timed as a whole, so
+timer overhead does not count. Each batch is run `warmup` times untimed and
+then `repeat` times timed, and we report percentiles of the time per op. A
+percentile is only reported when there are enough repeats to tell it from
+the maximum: p90 needs 10 and p99 needs 100 (e.g. --repeat 100).
+
+Benchmarks with state that would carry over from one batch to the next,
+such as the hand strength cache or a learning agent, reset it untimed
+before every batch, so that all batches do the same work.
+
+    python performance/benchmark.py                       # run everything
+    python performance/benchmark.py -k evaluate           # names matching
+    python performance/benchmark.py --json results.json   # save results
+    python performance/benchmark.py --compare base.json   # flag regressions
+
+With --compare, any benchmark whose median time per op is more than
+--threshold (default 10%) slower than the saved baseline is reported, and
+the exit status is 1.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from deuces import Deck, Evaluator
+from deuces.lookup import LookupTable
+
+BENCHMARKS = []
+
+def benchmark(name, number):
+    """
+    Registers a benchmark. The decorated function does the setup and returns
+    a callable that performs `number` operations, or a (run, reset) pair
+    where reset() is called untimed before every batch.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, number, setup))
+        return setup
+    return register
+
+def deal(n, board_size, seed=0):
+    rng = random.Random(seed)
+    hands = []
+    for i in xrange(n):
+        deck = Deck(rng)
+        hands.append((deck.draw(2), deck.draw(board_size)))
+    return hands
+
+###
+# deuces
+
+def evaluate(board_size, n=10000):
+    evaluator = Evaluator()
+    hands = deal(n, board_size)
+    evaluator.evaluate(*hands[0])
+    def run():
+        for hand, board in hands:
+            evaluator.evaluate(hand, board)
+    return run
+
+@benchmark('evaluate_5', 10000)
+def evaluate_5():
+    return evaluate(3)
+
+@benchmark('evaluate_6', 10000)
+def evaluate_6():
+    return evaluate(4)
+
+@benchmark('evaluate_7', 10000)
+def evaluate_7():
+    return evaluate(5)
+
+@benchmark('evaluate_batch_7', 100000)
+def evaluate_batch_7():
+    import numpy as np
+    evaluator = Evaluator()
+    hands = deal(100000, 5)
+    hole = np.array([hand for hand, board in hands])
+    boards = np.array([board for hand, board in hands])
+    evaluator.evaluate_batch(hole[:1], boards[:1])
+    def run():
+        evaluator.evaluate_batch(hole, boards)
+    return run
+
+@benchmark('lookup_table_build', 1)
+def lookup_table_build():
+    def run():
+        LookupTable().six_and_seven()
+    return run
+
+@benchmark('deck_deal_9', 10000)
+def deck_deal_9():
+    def run():
+        for i in xrange(10000):
+            Deck().draw(9)
+    return run
+
+###
+# Leduc, imported on demand
+
+def leduc():
+    import leduc
+    return leduc
+
+def random_states(n, seed=0):
+    """
+    Game states of player1's decisions collected from random games.
+    """
+    game_module = leduc()
+    random.seed(seed)
+    states = []
+    while len(states) < n:
+        game = game_module.Poker(num_rounds=5)
+        while not game.isEnd():
+            if game.player() == 'Player1':
+                states.append(game.getState())
+            game.successor(game.state, random.choice(game.legalActions(game.state)))
+    return states[:n]
+
+@benchmark('poker_successor_game', 1000)
+def poker_successor_game():
+    game_module = leduc()
+    def run():
+        for i in xrange(1000):
+            game = game_module.Poker(num_rounds=5)
+            while not game.isEnd():
+                game.successor(game.state, random.choice(game.legalActions(game.state)))
+    return run
+
+@benchmark('poker_getState', 10000)
+def poker_getState():
+    game = leduc().Poker(num_rounds=5)
+    def run():
+        for i in xrange(10000):
+            game.getState()
+    return run
+
+def extractor(name):
+    """
+    Each batch starts from an empty hand strength cache, so that it measures
+    the extractor rather than cache hits on the states of the previous batch.
+    """
+    game_module = leduc()
+    featureExtractor = getattr(game_module, name)
+    states = random_states(2000)
+    def run():
+        for state in states:
+            for action in game_module.legalActions(state):
+                featureExtractor(state, action)
+    return run, game_module.handStrength.clear
+
+@benchmark('handActionFeatureExtractor', 2000)
+def hand_action_feature_extractor():
+    return extractor('handActionFeatureExtractor')
+
+@benchmark('handPotRoundsActionFeatureExtractor', 2000)
+def hand_pot_rounds_action_feature_extractor():
+    return extractor('handPotRoundsActionFeatureExtractor')
+
+@benchmark('simulate_random_vs_random', 1000)
+def simulate_random_vs_random():
+    game_module = leduc()
+    player = game_module.RandomPlayer()
+    def run():
+        game_module.simulate(player, player, numTrials=1000, printEvery=0)
+    def reset():
+        game_module.handStrength.clear()
+        random.seed(0)
+    return run, reset
+
+@benchmark('simulate_qlearning_vs_baseline', 1000)
+def simulate_qlearning_vs_baseline():
+    game_module = leduc()
+    player2 = game_module.BaselinePlayer()
+    players = []
+    def run():
+        game_module.simulate(players[0], player2, numTrials=1000, printEvery=0)
+    def reset():
+        # a fresh learner on the same games every batch
+        players[:] = [game_module.QLearningAlgorithm(game_module.legalActions,
+            game_module.handPotRoundsActionFeatureExtractor, explorationProb=0.2)]
+        game_module.handStrength.clear()
+        random.seed(0)
+    return run, reset
+
+###
+# harness
+
+def percentile(samples, q):
+    """
+    Nearest rank percentile of a sorted list, or None when there are too few
+    samples for it to differ from the maximum.
+    """
+    if len(samples) < 100.0 / (100 - q):
+        return None
+    index = int(round(q / 100.0 * (len(samples) - 1)))
+    return samples[index]
+
+def run_benchmark(number, setup, warmup, repeat):
+    run = setup()
+    run, reset = run if isinstance(run, tuple) else (run, None)
+    for i in xrange(warmup):
+        if reset:
+            reset()
+        run()
+
+    samples = sorted(timeit.Timer(run, setup=reset or 'pass').repeat(repeat=repeat, number=1))
+    per_op = [t / number for t in samples]
+    median = per_op[(len(per_op) - 1) // 2]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': per_op[0],
+        'median': median,
+        'mean': sum(per_op) / len(per_op),
+        'p90': percentile(per_op, 90),
+        'p99': percentile(per_op, 99),
+        'max': per_op[-1],
+        'ops_per_sec': 1.0 / median,
+    }
+
+def microseconds(seconds):
+    return '-' if seconds is None else '%.3f' % (seconds * 1e6)
+
+def compare(results, baseline, threshold):
+    """
+    Returns the (name, baseline median, median) of every benchmark that got
+    slower than the baseline by more than threshold.
+    """
+    regressions = []
+    for name, stats in sorted(results.iteritems()):
+        if name in baseline and stats['median'] > baseline[name]['median'] * (1.0 + threshold):
+            regressions.append((name, baseline[name]['median'], stats['median']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    results = {}
+    print "%-36s %12s %12s %12s %12s %14s" % ("benchmark", "median (us)", "p90 (us)", "p99 (us)", "min (us)", "ops/sec")
+    for name, number, setup in BENCHMARKS:
+        if args.pattern not in name:
+            continue
+        stats = run_benchmark(number, setup, args.warmup, args.repeat)
+        results[name] = stats
+        print "%-36s %12.3f %12s %12s %12.3f %14.1f" % (name, stats['median'] * 1e6,
+            microseconds(stats['p90']), microseconds(stats['p99']), stats['min'] * 1e6, stats['ops_per_sec'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print "[!] %s regressed: %.3f us -> %.3f us per op (%+.1f%%)" % (
+                name, before * 1e6, after * 1e6, (after / before - 1.0) * 100)
+        if regressions:
+            return 1
+        print "[*] No regressions over %.0f%% against %s" % (args.threshold * 100, args.compare)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Runs the Leduc training and evaluation experiments.
+
+Each experiment trains player1 against an opponent for `train` games, then
+turns exploration off and evaluates it for `eval` more games. The default
+experiments are the ones leduc.py used to run on import; a JSON file with a
+list of experiments in the same format as EXPERIMENTS can be given instead.
+
+    python run_experiments.py                          # run everything
+    python run_experiments.py -e hand_action_vs_random # experiments by name
+    python run_experiments.py --train 5000 --eval 1000 # shorter runs
+    python run_experiments.py --config experiments.json
+    python run_experiments.py --list
+
+With --checkpoint, Q-learning players are checkpointed while they train, and
+a rerun with the same --checkpoint resumes each experiment from its last
+checkpoint instead of starting over.
+
+With --exploitability, the exploitability of player1's greedy policy is
+measured every --checkpoint-every training games (see exploitability.py).
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+
+import leduc
+from exploitability import exploitability
+
+# player1 is either one of the LEARNERS, trained with the given feature
+# extractor, or one of the fixed OPPONENTS
+EXPERIMENTS = [
+    {'name': 'hand_action_vs_random', 'title': 'Hand Action RL vs. Random',
+     'player1': 'qlearning', 'extractor': 'handActionFeatureExtractor', 'opponent': 'random'},
+    {'name': 'hand_pot_action_vs_random', 'title': 'Hand Pot Action RL vs. Random',
+     'player1': 'qlearning', 'extractor': 'handPotActionFeatureExtractor', 'opponent': 'random'},
+    {'name': 'hand_pot_rounds_action_vs_random', 'title': 'Hand Pot Action Num Rounds RL vs. Random',
+     'player1': 'qlearning', 'extractor': 'handPotRoundsActionFeatureExtractor', 'opponent': 'random'},
+    {'name': 'hand_pot_rounds_action_vs_baseline', 'title': 'Hand Pot Action Num Rounds RL vs. Baseline',
+     'player1': 'qlearning', 'extractor': 'handPotRoundsActionFeatureExtractor', 'opponent': 'baseline'},
+    {'name': 'hand_pot_rounds_action_vs_oracle', 'title': 'Hand Pot Action Num Rounds RL vs. Oracle',
+     'player1': 'qlearning', 'extractor': 'handPotRoundsActionFeatureExtractor', 'opponent': 'oracle',
+     'weights': True},
+]
+
+DEFAULTS = {'train': 50000, 'eval': 10000, 'explorationProb': 0.2, 'weights': False}
+
+OPPONENTS = {
+    'random': leduc.RandomPlayer,
+    'baseline': leduc.BaselinePlayer,
+    'oracle': leduc.OraclePlayer,
+}
+
+# learners for player1, with their extra config keys passed as keyword
+# arguments: 'replay' takes e.g. {"capacity": 65536, "batchSize": 32}
+LEARNERS = {
+    'qlearning': (leduc.QLearningAlgorithm, None),
+    'replay': (leduc.ReplayQLearningAlgorithm, 'replay'),
+}
+
+def make_player1(experiment):
+    if experiment['player1'] in LEARNERS:
+        learner, options = LEARNERS[experiment['player1']]
+        featureExtractor = getattr(leduc, experiment['extractor'])
+        kwargs = experiment.get(options, {}) if options else {}
+        return learner(leduc.legalActions, featureExtractor,
+                       explorationProb=experiment['explorationProb'], **kwargs)
+    return OPPONENTS[experiment['player1']]()
+
+def print_weights(player):
+    print('Weights Learned:')
+    weights = sorted(player.namedWeights().items(), key=lambda x: x[1])
+    for k, v in weights:
+        if v != 0:
+            print('{}: {:.2f}'.format(k, v))
+
+def print_exploitability(player, played):
+    greedy = copy.copy(player)
+    greedy.explorationProb = 0.0
+    result = exploitability(greedy)
+    print('Exploitability after {} games: {:.4f} +/- {:.4f} ({:.1f}s)'.format(
+        played, result['exploitability'], result['stderr'], result['seconds']))
+
+def run(experiment, seed=None, workers=1, checkpoint=None, checkpoint_every=10000, measure=False):
+    """
+    Trains and evaluates one experiment, returns the average utility of the
+    evaluation games. Q-learning players are checkpointed to 
+    checkpoint-<name>.ckpt if checkpoint is given, and resumed from there.
+    If measure is set, prints the exploitability of player1 every
+    checkpoint_every training games.
+    """
+    title = experiment.get('title', experiment['name'])
+    print('=' * len(title))
+    print(title)
+    print('=' * len(title))
+
+    player1 = make_player1(experiment)
+    player2 = OPPONENTS[experiment['opponent']]()
+
+    checkpointer = None
+    played = 0
+    if checkpoint and experiment['player1'] == 'qlearning':
+        path = '{}-{}.ckpt'.format(checkpoint, experiment['name'])
+        if os.path.exists(path):
+            saved = leduc.Checkpoint.read(path)
+            player1 = saved.toAlgorithm(featureExtractor=player1.featureExtractor)
+            played = saved.numGames
+            print('Resuming from {} after {} games'.format(path, played))
+        checkpointer = leduc.Checkpointer(path, checkpoint_every, played)
+
+    if experiment['train'] > played:
+        # a resumed run continues the random state saved with the checkpoint
+        # (measuring leaves the random state alone, so splitting the
+        # training into segments plays the same games)
+        totalRewards = []
+        while played < experiment['train']:
+            games = experiment['train'] - played
+            if measure:
+                games = min(games, checkpoint_every - played % checkpoint_every)
+            totalRewards += leduc.simulate(player1, player2, numTrials=games,
+                                           seed=None if played else seed,
+                                           checkpointer=checkpointer)
+            played += games
+            if measure:
+                print_exploitability(player1, played)
+        print('Final avg utility: {}'.format(sum(totalRewards)*1.0/len(totalRewards)))
+        print('==============')
+
+    # learning is done, evaluation can be sharded over workers
+    player1.explorationProb = 0.0
+    totalRewards = leduc.simulate(player1, player2, numTrials=experiment['eval'], workers=workers,
+                                  seed=None if seed is None else seed + 1)
+    average = sum(totalRewards)*1.0/len(totalRewards)
+    print('Final avg utility: {}'.format(average))
+    print('==============')
+
+    if experiment['weights'] and isinstance(player1, leduc.QLearningAlgorithm):
+        print_weights(player1)
+    return average
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-e', dest='names', action='append', help='only run this experiment (repeatable)')
+    parser.add_argument('--config', help='JSON file with a list of experiments to run instead of the defaults')
+    parser.add_argument('--train', type=int, help='training games per experiment')
+    parser.add_argument('--eval', type=int, help='evaluation games per experiment')
+    parser.add_argument('--seed', type=int, help='seed the games for reproducible runs')
+    parser.add_argument('--workers', type=int, default=1, help='processes for the evaluation games')
+    parser.add_argument('--checkpoint', help='checkpoint training to files with this prefix, resuming from them')
+    parser.add_argument('--checkpoint-every', type=int, default=10000, help='training games between checkpoints')
+    parser.add_argument('--exploitability', action='store_true',
+                        help='measure the exploitability of player1 every --checkpoint-every training games')
+    parser.add_argument('--list', action='store_true', help='list the experiments and exit')
+    args = parser.parse_args(argv)
+
+    experiments = EXPERIMENTS
+    if args.config:
+        with open(args.config) as f:
+            experiments = json.load(f)
+
+    if args.names:
+        unknown = set(args.names) - set(e['name'] for e in experiments)
+        if unknown:
+            parser.error('unknown experiments: {}'.format(', '.join(sorted(unknown))))
+        experiments = [e for e in experiments if e['name'] in args.names]
+
+    if args.list:
+        for experiment in experiments:
+            print(experiment['name'])
+        return 0
+
+    for experiment in experiments:
+        experiment = dict(DEFAULTS, **experiment)
+        if args.train is not None:
+            experiment['train'] = args.train
+        if args.eval is not None:
+            experiment['eval'] = args.eval
+        run(experiment, args.seed, args.workers, args.checkpoint, args.checkpoint_every, args.exploitability)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
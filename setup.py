@@ -13,6 +13,9 @@ setup(
     url='https://github.com/worldveil/deuces',
     license='MIT',
     packages=['deuces'],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
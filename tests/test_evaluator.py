@@ -0,0 +1,83 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from deuces import Card, Deck, Evaluator
+from deuces.batch import BatchEvaluator
+from deuces.flatlookup import FlatLookupTable
+
+HANDS = 3000
+
+# |count| hands of |size| cards from a deck seeded with |seed|. Flush heavy
+# hands take at least 5 of their cards from a single suit.
+def sampleHands(size, count, seed, flushes=False):
+    rng = random.Random(seed)
+    deck = Deck.GetFullDeck()
+    hands = []
+    for i in range(count):
+        if flushes:
+            suit = rng.choice([1, 2, 4, 8])
+            suited = [c for c in deck if Card.get_suit_int(c) == suit]
+            hand = rng.sample(suited, 5)
+            hand += rng.sample([c for c in deck if c not in hand], size - 5)
+            rng.shuffle(hand)
+        else:
+            hand = rng.sample(deck, size)
+        hands.append(hand)
+    return hands
+
+class EvaluatorTest(unittest.TestCase):
+    '''
+    The single pass, flat and batch evaluators against the original
+    evaluator, which ranks every 5 card subset with the prime product
+    dictionaries.
+    '''
+    @classmethod
+    def setUpClass(cls):
+        cls.combinatorial = Evaluator(direct=False)
+        cls.direct = Evaluator()
+        cls.flat = Evaluator(flat=True)
+        cls.flatTable = FlatLookupTable.shared()
+        cls.batch = BatchEvaluator(cls.flatTable)
+
+    def checkAgreement(self, size, seed, flushes=False):
+        hands = sampleHands(size, HANDS, seed, flushes)
+        expected = [self.combinatorial.evaluate(hand[:2], hand[2:]) for hand in hands]
+
+        self.assertEqual([self.direct.evaluate(hand[:2], hand[2:]) for hand in hands], expected)
+        self.assertEqual([self.flat.evaluate(hand[:2], hand[2:]) for hand in hands], expected)
+        self.assertEqual([min(self.flatTable.five(list(five)) for five in itertools.combinations(hand, 5))
+                          for hand in hands], expected)
+
+        cards = np.array(hands)
+        self.assertEqual(self.batch.evaluate(cards[:, :2], cards[:, 2:]).tolist(), expected)
+        indices = np.array([[BatchEvaluator.INDEX_TO_CARD.tolist().index(c) for c in hand] for hand in hands])
+        self.assertEqual(self.batch.evaluate(indices[:, :2], indices[:, 2:]).tolist(), expected)
+        if flushes:
+            self.assertTrue(all(rank <= 1599 for rank in expected))
+
+    def testFiveCards(self):
+        self.checkAgreement(5, 0)
+
+    def testSixCards(self):
+        self.checkAgreement(6, 1)
+
+    def testSevenCards(self):
+        self.checkAgreement(7, 2)
+
+    def testFiveCardFlushes(self):
+        self.checkAgreement(5, 3, flushes=True)
+
+    def testSixCardFlushes(self):
+        self.checkAgreement(6, 4, flushes=True)
+
+    def testSevenCardFlushes(self):
+        self.checkAgreement(7, 5, flushes=True)
+
+    def testFlatTableMatchesDictionaries(self):
+        self.assertEqual(self.flatTable.verify(self.combinatorial.table), 2598960)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+from cfr import FIRST_BOARD, NUM_ROUNDS
+from deuces import Evaluator
+from deuces.batch import BatchEvaluator
+from deuces.flatlookup import FlatLookupTable
+from exploitability import BestResponse, exploitability, sampleDeals
+from leduc import PLAYER1, PLAYER2, PLAYERS, Poker
+
+GROUPS = 256
+OPPONENT_HANDS = 8
+
+class CallingStation:
+    '''
+    Checks when it can and calls otherwise, whatever its cards and seat.
+    '''
+    def getAction(self, game):
+        actions = game.legalActions(game.state)
+        return 'check' if 'check' in actions else 'call'
+
+# Plays one deal of the real game, the best responder acting on the choices
+# |response| fitted. Returns the best responder's utility.
+def playout(response, agent, agentHand, board, opponentHand):
+    evaluator = Evaluator()
+    game = Poker(num_rounds=NUM_ROUNDS)
+    state = game.state
+    if response.seat == PLAYER1:
+        state['player1Hand'], state['player2Hand'] = agentHand, opponentHand
+    else:
+        state['player1Hand'], state['player2Hand'] = opponentHand, agentHand
+    state['communityCards'] = board[:FIRST_BOARD]
+    state['deck'].shuffle()
+    state['deck'].putBack(board[:FIRST_BOARD - 1:-1])
+
+    ranks = [evaluator.evaluate(opponentHand, board[:FIRST_BOARD + r]) for r in (0, 1)]
+    buckets = [int(np.searchsorted(response.boundaries[r], ranks[r], side='right')) for r in (0, 1)]
+    states = {1: buckets[0], 2: buckets[0] * response.numBuckets + buckets[1]}
+
+    node = response.tree
+    while not game.isEnd():
+        player = game.player()
+        if player == 'Dealer':
+            action = 'draw_card'
+        elif player == PLAYERS[response.seat]:
+            action = agent.getAction(game)
+        else:
+            choices = response.choices.get(node)
+            action = node.actions[choices[states[node.round]] if choices is not None else 0]
+        if node.kind != 'terminal':
+            node = node.children[node.actions.index(action) if node.kind == 'decision' else 0]
+        game.successor(state, action)
+
+    utility = game.utility()
+    return utility if response.seat == PLAYER2 else -utility
+
+class BestResponseTest(unittest.TestCase):
+    def testValueMatchesPlayouts(self):
+        agent = CallingStation()
+        for seat in (PLAYER1, PLAYER2):
+            response = BestResponse(agent, seat)
+            rng = np.random.RandomState(0)
+            response.fit(rng, GROUPS, OPPONENT_HANDS)
+            sample = rng.get_state()
+            value, _ = response.evaluate(rng, GROUPS, OPPONENT_HANDS)
+
+            rng.set_state(sample)
+            agentHands, boards, opponents = [BatchEvaluator.INDEX_TO_CARD[cards].tolist()
+                                             for cards in sampleDeals(rng, GROUPS, OPPONENT_HANDS)]
+            utilities = [playout(response, agent, agentHands[i // OPPONENT_HANDS],
+                                 boards[i // OPPONENT_HANDS], opponents[i])
+                         for i in range(len(opponents))]
+            self.assertAlmostEqual(value, np.mean(utilities))
+
+    def testSymmetricStrategySameInEitherSeat(self):
+        results = [exploitability(CallingStation(), seat, GROUPS, OPPONENT_HANDS) for seat in (PLAYER1, PLAYER2)]
+        self.assertGreater(results[0]['exploitability'], 0)
+        self.assertGreater(results[1]['exploitability'], 0)
+
+        # the seats only differ by showdown ties, which go to player2: worth
+        # at most the 2 chips each player bets per tie to the best responder
+        batch = BatchEvaluator(FlatLookupTable.shared())
+        agentHands, boards, opponents = sampleDeals(np.random.RandomState(0), GROUPS, OPPONENT_HANDS)
+        boards = np.repeat(boards, OPPONENT_HANDS, axis=0)
+        ties = np.mean(batch.evaluate(np.repeat(agentHands, OPPONENT_HANDS, axis=0), boards) ==
+                       batch.evaluate(opponents, boards))
+        stderr = np.hypot(results[0]['stderr'], results[1]['stderr'])
+        self.assertLess(abs(results[0]['exploitability'] - results[1]['exploitability']), 4 * ties + 3 * stderr)
+
+if __name__ == '__main__':
+    unittest.main()
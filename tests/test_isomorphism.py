@@ -0,0 +1,84 @@
+import itertools
+import random
+import unittest
+
+from deuces import Card, Deck
+from deuces.isomorphism import HandIndexer
+
+DEALS = 2000
+
+# |card| with its suit mapped through |permutation|, a dict of suit chars.
+def permuteSuit(card, permutation):
+    name = Card.int_to_str(card)
+    return Card.new(name[0] + permutation[name[1]])
+
+class HandIndexerTest(unittest.TestCase):
+    '''
+    The ids of HandIndexer: the same for deals that only differ by the
+    order of the cards in a round or by a permutation of the suits, dense,
+    and inverted by unindex().
+    '''
+    def sampleDeals(self, seed, boardSize):
+        rng = random.Random(seed)
+        deck = Deck.GetFullDeck()
+        for i in range(DEALS):
+            cards = rng.sample(deck, 2 + boardSize)
+            yield cards[:2], cards[2:]
+
+    def testStreetSizes(self):
+        self.assertEqual(HandIndexer.for_street(0).size(0), 169)
+        self.assertEqual(HandIndexer.for_street(3).size(1), 1286792)
+        self.assertEqual(HandIndexer.for_street(4).size(1), 13960050)
+        self.assertEqual(HandIndexer.for_street(5).size(1), 123156254)
+        indexer = HandIndexer.shared((2, 3, 1, 1))
+        self.assertEqual([indexer.size(r) for r in range(4)], [169, 1286792, 55190538, 2428287420])
+
+    def testPreflopIdsAreDense(self):
+        indexer = HandIndexer.for_street(0)
+        ids = set(indexer.index(hand) for hand in itertools.combinations(Deck.GetFullDeck(), 2))
+        self.assertEqual(ids, set(range(169)))
+
+    def testSuitPermutationInvariance(self):
+        rng = random.Random(0)
+        for boardSize in (0, 3, 4, 5):
+            indexer = HandIndexer.for_street(boardSize)
+            for hand, board in self.sampleDeals(boardSize, boardSize):
+                suits = list('shdc')
+                rng.shuffle(suits)
+                permutation = dict(zip('shdc', suits))
+                self.assertEqual(indexer.index([permuteSuit(c, permutation) for c in hand],
+                                               [permuteSuit(c, permutation) for c in board]),
+                                 indexer.index(hand, board))
+
+    def testCardOrderInvariance(self):
+        rng = random.Random(1)
+        for boardSize in (3, 4, 5):
+            indexer = HandIndexer.for_street(boardSize)
+            for hand, board in self.sampleDeals(boardSize + 10, boardSize):
+                shuffled = list(board)
+                rng.shuffle(shuffled)
+                self.assertEqual(indexer.index(hand[::-1], shuffled), indexer.index(hand, board))
+
+    def testRoundsAreKeptApart(self):
+        indexer = HandIndexer.shared((2, 3, 1))
+        hand = [Card.new('Ah'), Card.new('Kh')]
+        flop = [Card.new('2h'), Card.new('7h'), Card.new('Td')]
+        self.assertNotEqual(indexer.index(hand, flop + [Card.new('3h')]),
+                            indexer.index(hand, [Card.new('3h')] + flop[1:] + flop[:1]))
+        self.assertNotEqual(HandIndexer.for_street(3).index(hand, flop),
+                            HandIndexer.for_street(3).index(hand, [Card.new('2d'), Card.new('7d'), Card.new('Td')]))
+
+    def testUnindexRoundTrip(self):
+        rng = random.Random(2)
+        for boardSize in (0, 3, 4, 5):
+            indexer = HandIndexer.for_street(boardSize)
+            round = indexer.rounds - 1
+            for i in range(DEALS):
+                index = rng.randrange(indexer.size(round))
+                hand, board = indexer.unindex(round, index)
+                self.assertEqual(len(set(hand + board)), 2 + boardSize)
+                self.assertEqual(indexer.index(hand, board), index)
+                self.assertEqual(indexer.canonical(hand, board), (hand, board))
+
+if __name__ == '__main__':
+    unittest.main()
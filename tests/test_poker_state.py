@@ -0,0 +1,87 @@
+import random
+import unittest
+
+import numpy as np
+
+from leduc import ACTIONS, ACTION_IDS, PokerState, Poker, VectorPoker
+
+GAMES = 2000
+NUM_ROUNDS = 5
+
+class PokerStateTest(unittest.TestCase):
+    '''
+    PokerState and VectorPoker against Poker, on seeded random games.
+    Short stacks make the players run out of chips, so the games where
+    betting is no longer allowed are covered too.
+    '''
+    def stacks(self, rng):
+        return rng.choice([(100, 100), (1, 100), (2, 3)])
+
+    def testApplyUndoMatchesPoker(self):
+        rng = random.Random(0)
+        for i in range(GAMES):
+            player1Stack, player2Stack = self.stacks(rng)
+            game = Poker(num_rounds=NUM_ROUNDS, player1Stack=player1Stack, player2Stack=player2Stack)
+            compact = PokerState.fromGame(game)
+            start = compact.key()
+
+            while not game.isEnd():
+                self.assertEqual(compact.key(), PokerState.fromGame(game).key())
+                actions = game.legalActions(game.state)
+                self.assertEqual(compact.legalActions(), actions)
+
+                # every legal action is undone exactly
+                before = (compact.key(), list(compact.history))
+                for action in actions:
+                    cards = (rng.choice(range(52)),) if action == 'draw_card' else ()
+                    compact.apply(action, cards)
+                    compact.undo()
+                    self.assertEqual((compact.key(), compact.history), before)
+
+                action = rng.choice(actions)
+                game.successor(game.state, action)
+                cards = game.state['communityCards'][len(compact.communityCards):] if action == 'draw_card' else ()
+                compact.apply(action, cards)
+
+            self.assertEqual(compact.key(), PokerState.fromGame(game).key())
+            self.assertTrue(compact.isEnd())
+            self.assertEqual(compact.utility(), game.utility())
+
+            while compact.history:
+                compact.undo()
+            self.assertEqual(compact.key(), start)
+
+    def testVectorPokerMatchesPoker(self):
+        rng = random.Random(1)
+        for player1Stack, player2Stack in [(100, 100), (1, 100), (2, 3)]:
+            vector = VectorPoker(GAMES, num_rounds=NUM_ROUNDS, player1Stack=player1Stack,
+                                 player2Stack=player2Stack, rng=np.random.RandomState(rng.getrandbits(32)))
+
+            # the same deals in Poker: the dealer draws the rest of the board
+            games = []
+            for i in range(GAMES):
+                game = Poker(num_rounds=NUM_ROUNDS, player1Stack=player1Stack, player2Stack=player2Stack)
+                state = game.state
+                state['player1Hand'] = vector.player1Hand[i].tolist()
+                state['player2Hand'] = vector.player2Hand[i].tolist()
+                board = vector.communityCards[i].tolist()
+                state['communityCards'] = board[:3]
+                state['deck'].putBack(board[:2:-1])
+                games.append(game)
+
+            while not vector.isEnd().all():
+                mask = vector.legalActionMask()
+                actions = vector.sampleLegalActions(mask)
+                for i, game in enumerate(games):
+                    self.assertEqual(vector.state(i).key(), PokerState.fromGame(game).key())
+                    legal = [] if game.isEnd() else game.legalActions(game.state)
+                    self.assertEqual([ACTIONS[a] for a in np.flatnonzero(mask[i])], sorted(legal, key=ACTION_IDS.get))
+                    if actions[i] >= 0:
+                        game.successor(game.state, ACTIONS[actions[i]])
+                vector.step(actions)
+
+            self.assertTrue(all(game.isEnd() for game in games))
+            self.assertEqual(vector.utility().tolist(), [game.utility() for game in games])
+
+if __name__ == '__main__':
+    unittest.main()
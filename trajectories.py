@@ -0,0 +1,165 @@
+'''
+Binary log of the games played by simulate(), for offline analysis.
+
+    with TrajectoryWriter('games.trj') as log:
+        simulate(player1, player2, numTrials=50000, log=log)
+
+    games = TrajectoryReader('games.trj')
+    games.column('reward').mean()
+    for game in games.games(): ...
+
+A file is a 16 byte header (8 byte magic, uint32 version, uint32 record
+size) followed by one fixed width record per game, laid out as RECORD_DTYPE.
+The writer packs records into a chunk in memory and appends the whole chunk
+at once, so logging costs one struct.pack_into() per game. The reader maps
+the file and exposes it as a NumPy record array, whose columns are views
+into the mapped pages: nothing is read until it is used.
+'''
+import os
+import struct
+
+import numpy as np
+
+from deuces import Card
+from leduc import ACTIONS, ACTION_IDS
+
+FILE_MAGIC = 'LEDUCTRJ'
+FILE_VERSION = 2
+HEADER = struct.Struct('<8sII')
+
+# simulate() deals 3 community cards with the hands and bets with 3 and 4
+# of them on the board, each betting round ending in a draw_card (the last
+# one ends the game). A round takes at most 3 actions: bet, raise, call.
+BOARD_SIZE = 5
+BETTING_ROUNDS = BOARD_SIZE - 3
+MAX_ACTIONS = BETTING_ROUNDS * (3 + 1)
+NO_CARD = 255
+
+# card index, 4 * rank + suit with suits ordered s, h, d, c, as in
+# deuces.batch.BatchEvaluator
+INDEX_TO_CARD = [Card.new(r + s) for r in Card.STR_RANKS for s in 'shdc']
+CARD_TO_INDEX = dict((card, i) for i, card in enumerate(INDEX_TO_CARD))
+
+#   reward: player1's utility
+#   player1Bet, player2Bet: chips each player put in
+#   hands: card indices of player1's and player2's hands
+#   board: card indices of the community cards in dealing order, NO_CARD
+#     for those never dealt
+#   numActions, actions: ACTION_IDS of the actions taken, in order
+#   folds: 1 if player1 folded, 2 if player2 folded
+RECORD_DTYPE = np.dtype([
+    ('reward', '<f4'),
+    ('player1Bet', '<i2'),
+    ('player2Bet', '<i2'),
+    ('hands', 'u1', (2, 2)),
+    ('board', 'u1', (BOARD_SIZE,)),
+    ('numActions', 'u1'),
+    ('actions', 'u1', (MAX_ACTIONS,)),
+    ('folds', 'u1'),
+])
+RECORD = struct.Struct('<fhh4B%dBB%dBB' % (BOARD_SIZE, MAX_ACTIONS))
+assert RECORD.size == RECORD_DTYPE.itemsize
+
+class TrajectoryWriter:
+    # Appends to |path| if it already holds a log, keeping |chunkSize| games
+    # in memory between writes. A record cut short by a crash is dropped
+    # first, so the records appended after it stay aligned.
+    def __init__(self, path, chunkSize=4096):
+        self.path = path
+        self.chunkSize = chunkSize
+        self.chunk = bytearray(chunkSize * RECORD.size)
+        self.pending = 0
+        self.numGames = 0
+
+        if os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            with open(path, 'r+b') as f:
+                readHeader(f.read(HEADER.size))
+                numGames = (os.path.getsize(path) - HEADER.size) // RECORD.size
+                f.truncate(HEADER.size + numGames * RECORD.size)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(HEADER.pack(FILE_MAGIC, FILE_VERSION, RECORD.size))
+
+    # Records the finished |game| (a leduc.Poker), given the |actions| taken
+    # in it and player1's |reward|.
+    def add(self, game, actions, reward):
+        if len(actions) > MAX_ACTIONS:
+            raise Exception("Game has {} actions, records hold {}".format(len(actions), MAX_ACTIONS))
+        state = game.state
+        hands = [CARD_TO_INDEX[c] for c in state['player1Hand'] + state['player2Hand']]
+        board = [CARD_TO_INDEX[c] for c in state['communityCards']]
+        board += [NO_CARD] * (BOARD_SIZE - len(board))
+        actionIds = [ACTION_IDS[a] for a in actions]
+        actionIds += [0] * (MAX_ACTIONS - len(actionIds))
+        folds = (1 if state['player1Fold'] else 0) | (2 if state['player2Fold'] else 0)
+
+        values = [reward, sum(state['player1Bets']), sum(state['player2Bets'])]
+        values += hands + board + [len(actions)] + actionIds + [folds]
+        RECORD.pack_into(self.chunk, self.pending * RECORD.size, *values)
+
+        self.pending += 1
+        self.numGames += 1
+        if self.pending == self.chunkSize:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.file.write(buffer(self.chunk, 0, self.pending * RECORD.size))
+            self.pending = 0
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TrajectoryReader:
+    # Maps the games logged in |path|. A partly written last record is left
+    # out, so a log can be read while it is being written.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            readHeader(f.read(HEADER.size))
+        numGames = (os.path.getsize(path) - HEADER.size) // RECORD.size
+        if numGames:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size, shape=(numGames,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    # All the values of a field of RECORD_DTYPE, e.g. column('reward').
+    def column(self, name):
+        return self.records[name]
+
+    # The game at |i| decoded to card ints and action names.
+    def game(self, i):
+        record = self.records[i]
+        return {
+            'reward': float(record['reward']),
+            'player1Bet': int(record['player1Bet']),
+            'player2Bet': int(record['player2Bet']),
+            'player1Hand': [INDEX_TO_CARD[c] for c in record['hands'][0]],
+            'player2Hand': [INDEX_TO_CARD[c] for c in record['hands'][1]],
+            'communityCards': [INDEX_TO_CARD[c] for c in record['board'] if c != NO_CARD],
+            'actions': [ACTIONS[a] for a in record['actions'][:record['numActions']]],
+            'player1Fold': bool(record['folds'] & 1),
+            'player2Fold': bool(record['folds'] & 2),
+        }
+
+    # Decodes the games in [start, stop) one at a time.
+    def games(self, start=0, stop=None):
+        for i in xrange(start, len(self) if stop is None else min(stop, len(self))):
+            yield self.game(i)
+
+def readHeader(data):
+    magic, version, recordSize = HEADER.unpack(data)
+    if magic != FILE_MAGIC or version != FILE_VERSION or recordSize != RECORD.size:
+        raise Exception("Invalid trajectory file")